@@ -0,0 +1,29 @@
+"""
+Offline benchmarks for storm
+
+Run them as modules from the root of the repository, e.g.
+
+    python -m benchmarks.scheduler
+
+`benchmarks.suite` runs the hot paths of all of them in one go, and compares
+the results with those of an earlier run. `benchmarks.stress` goes the other
+way, and loads storm until it saturates.
+
+The config is read from the one shipped in the repository and the cache goes
+into a temporary directory, so running them does not touch a live storm.
+That is set up here, and the package is always imported before any of its
+modules, so the modules do not have to import it themselves.
+
+"""
+
+import os
+import tempfile
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Child processes inherit the environment, so only set it up once.
+if 'STORM_BENCHMARK' not in os.environ:
+    os.environ['STORM_BENCHMARK'] = tempfile.mkdtemp(prefix='storm-bench-')
+    os.environ['XDG_CONFIG_DIRS'] = REPO
+    os.environ['XDG_CONFIG_HOME'] = os.environ['STORM_BENCHMARK']
+    os.environ['XDG_CACHE_HOME'] = os.environ['STORM_BENCHMARK']
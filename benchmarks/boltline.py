@@ -0,0 +1,117 @@
+"""
+Cost of BoltLine.compile() and width() per event
+
+Puts `--bolts` bolts with realistic markup in a fake cache root and times one
+event against the old way (every bolt read twice plus a regex pass over the
+line) and against the cached line (one bolt read, fragments joined). The
+writes of the changed bolts are not part of the time.
+
+    python -m benchmarks.boltline --bolts 24
+
+"""
+
+import os
+import re
+import timeit
+import argparse
+
+from storm import conf
+from storm import bolt
+from storm import util
+
+SAMPLE = (
+    "^fg(#a8c410)^bg(#111117)^i(/usr/share/storm/icons/cpu.xbm)^fg()^bg() "
+    "^fg(#9d9d9d)^bg(#111117)%d^fg()^bg()"
+)
+
+
+class LegacyLine():
+    """
+    BoltLine as it was; open files that are re-read on every compile
+
+    """
+
+    def __init__(self, names):
+        self.fds = [open(os.path.join(conf.ROOT, n)) for n in names]
+        self.separator = bolt.BoltLine().separator
+
+    def compile(self):
+        parts = []
+        for fd in self.fds:
+            fd.seek(0)
+            parts.append(fd.read())
+        return self.separator.join(parts)
+
+    def width(self):
+        text_only = re.sub(r'\^[^(]*([^)]*).', '', self.compile())
+        return len(text_only) * conf.CONFIG['font']['width']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--bolts', type=int, default=24)
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    os.makedirs(conf.ROOT, exist_ok=True)
+    names = ['bolt%02d' % i for i in range(args.bolts)]
+    for name in names:
+        util.atomic_write(os.path.join(conf.ROOT, name), SAMPLE % 0)
+
+    legacy = LegacyLine(names)
+    line = bolt.BoltLine()
+    line.register_bolts(*({'runner': n} for n in names))
+    line.refresh()
+
+    assert legacy.compile() == line.compile()
+    assert legacy.width() == line.width()
+
+    def legacy_event():
+        legacy.width()
+        legacy.compile()
+
+    def cached_events(generation):
+        """
+        Seconds that `--number` events take, one changed bolt per event
+
+        The bolts are written before the clock starts, so only the re-read
+        of the changed bolt and the render of the line are timed.
+
+        """
+
+        elapsed = 0
+        done = 0
+        while done < args.number:
+            generation += 1
+            batch = names[:args.number - done]
+            for name in batch:
+                util.atomic_write(
+                    os.path.join(conf.ROOT, name), SAMPLE % generation
+                )
+
+            start = timeit.default_timer()
+            for name in batch:
+                line.update(name)
+                line.width()
+                line.compile()
+            elapsed += timeit.default_timer() - start
+            done += len(batch)
+        return elapsed
+
+    # The best of a few runs, as the rest is noise
+    results = (
+        ('legacy', min(timeit.repeat(
+            legacy_event, number=args.number, repeat=3
+        ))),
+        ('cached', min(
+            cached_events(run * args.number) for run in range(1, 4)
+        )),
+    )
+
+    print('%d bolts, %d events' % (args.bolts, args.number))
+    for name, seconds in results:
+        print('%-8s %8.1f us/event' % (name, seconds / args.number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
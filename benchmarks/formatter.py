@@ -0,0 +1,73 @@
+"""
+Formatting calls per second for every StormFormatter method
+
+Each method is fed the example data from its docstring, varied a little
+between calls the way the sources vary it, e.g. another time of day or
+another focused tag.
+
+    python -m benchmarks.formatter --number 20000
+
+"""
+
+import timeit
+import argparse
+import itertools
+
+from storm import storm
+
+DATA = {
+    'tags': [
+        "\t#1\t:2\t.3\t.4\t.5",
+        "\t:1\t#2\t.3\t.4\t.5",
+        "\t:1\t:2\t#3\t!4\t.5",
+    ],
+    'windowtitle': ["main@rey", "vim storm.py"],
+    'date': [
+        {"day": "Mon", "date": "2013.09.02", "time": "19:23:%02d" % s}
+        for s in range(60)
+    ],
+    'network': [
+        {"ip": "192.168.1.23", "interface": "wlan0", "up": 0, "down": 81920.0},
+        {"ip": "192.168.1.23", "interface": "wlan0", "up": 1024.0, "down": 0},
+        {"ip": "N/A", "interface": None, "up": 0, "down": 0},
+    ],
+    'load': [(0.22, 0.24, 0.23), (1.5, 0.8, 0.4), (3.2, 2.1, 1.0)],
+    'processes': [161, 420, 700],
+    'mem_swap': [
+        {"memory": 4 * 1024**3, "swap": 0},
+        {"memory": 6 * 1024**3, "swap": 1024**3},
+    ],
+    'packages': [{"installed": 663, "new": 0}, {"installed": 663, "new": 12}],
+    'volume': [
+        {"volume": 71, "muted": False},
+        {"volume": 20, "muted": True},
+    ],
+    'hostname': ["rey"],
+    'kernel': ["2.10.9-1-ARCH"],
+    'power': [
+        {"percent": p, "ac_connected": p > 90, "time_left": "01:26"}
+        for p in (5, 15, 25, 45, 70, 95)
+    ],
+    'mail': [0, 3, 12],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    formatter = storm.StormFormatter()
+    total = 0
+    for name, examples in DATA.items():
+        method = getattr(formatter, name)
+        data = itertools.cycle(examples)
+        seconds = timeit.timeit(lambda: method(next(data)), number=args.number)
+        total += seconds
+        print('%-12s %10.0f calls/s' % (name, args.number / seconds))
+
+    print('%-12s %10.0f calls/s' % ('all', args.number * len(DATA) / total))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Stress the shared herbstclient idle listener with a flood of hooks
+
+A fake herbstclient replays `--lines` idle lines in bursts, and counts how
+often it is spawned for `tag_status`. The listener dispatches to a tags and a
+windowtitle subscriber like the real ones; the old model would have spawned
+one tag_status per tag hook, and one idle listener per hooked method.
+
+    python -m benchmarks.hlwm --lines 20000 --burst 200 --gap 0.01
+
+"""
+
+import os
+import sys
+import stat
+import time
+import argparse
+import tempfile
+
+from storm import hlwm
+
+FAKE = """#!{python}
+import sys, time, random
+
+if sys.argv[1] == 'tag_status':
+    with open({spawns!r}, 'a') as fp:
+        fp.write('.')
+    sys.stdout.write('\\t#1\\t:2\\t.3\\t.4')
+    sys.exit(0)
+
+rand = random.Random(0)
+hooks = ('tag_changed', 'tag_flags', 'focus_changed', 'window_title_changed')
+out = sys.stdout.buffer
+for i in range({lines}):
+    hook = rand.choice(hooks)
+    out.write(('%s\\t0x%x\\ttitle %d\\n' % (hook, i, i)).encode())
+    if i % {burst} == {burst} - 1:
+        out.flush()
+        time.sleep({gap})
+out.flush()
+"""
+
+
+def install_fake(root, args):
+    spawns = os.path.join(root, 'spawns')
+    path = os.path.join(root, 'herbstclient')
+    with open(path, 'w') as fp:
+        fp.write(FAKE.format(
+            python=sys.executable, spawns=spawns, lines=args.lines,
+            burst=args.burst, gap=args.gap
+        ))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return path, spawns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--lines', type=int, default=20000)
+    parser.add_argument('--burst', type=int, default=200)
+    parser.add_argument('--gap', type=float, default=0.01)
+    parser.add_argument('--batch', type=float, default=0.05)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='storm-hlwm-')
+    command, spawns = install_fake(root, args)
+
+    client = hlwm.Client(command)
+    listener = hlwm.IdleListener(command, batch=args.batch)
+    seen = {'tags': 0, 'windowtitle': 0}
+
+    def tags(hook):
+        seen['tags'] += 1
+        client.call('tag_status')
+
+    def windowtitle(hook):
+        seen['windowtitle'] += 1
+
+    listener.subscribe(('tag_changed', 'tag_flags'), tags)
+    listener.subscribe(('focus_changed', 'window_title_changed'), windowtitle)
+
+    start = time.monotonic()
+    listener.run()
+    elapsed = time.monotonic() - start
+
+    with open(spawns) as fp:
+        spawned = len(fp.read())
+
+    print('lines            %d in %.2fs (%.0f lines/s)' % (
+        listener.lines, elapsed, listener.lines / elapsed
+    ))
+    print('batches          %d' % listener.batches)
+    print('dispatches       tags %d, windowtitle %d' % (
+        seen['tags'], seen['windowtitle']
+    ))
+    print('tag_status runs  %d (one per tag hook would be %d)' % (
+        spawned, listener.hooks['tag_changed'] + listener.hooks['tag_flags']
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+End-to-end latency from Storm.write() to a line on the bar, per ipc mode
+
+Runs a Storm and a Cloud in this process, with the cloud writing into a sink
+that stands in for dzen2's stdin. In file mode the bolts go through the cache
+directory and inotify, in memory mode through a channel.
+
+    python -m benchmarks.ipc --samples 200
+
+"""
+
+import time
+import argparse
+import threading
+
+from storm import bolt
+from storm import cloud
+from storm import channel
+from storm.storm import Storm
+
+
+class Formatter():
+    pass
+
+
+class Sink():
+    """
+    Wakes up whoever waits for a line containing a given marker
+
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.lines = []
+
+    def write(self, data):
+        with self.cond:
+            self.lines.append((time.monotonic(), data))
+            self.cond.notify_all()
+
+    def flush(self):
+        pass
+
+    def wait_for(self, marker, timeout=5):
+        with self.cond:
+            while True:
+                for when, data in self.lines:
+                    if marker in data:
+                        self.lines = []
+                        return when
+                if not self.cond.wait(timeout):
+                    raise RuntimeError('Timed out waiting for %s' % marker)
+
+
+def measure(mode, samples, debounce):
+    chan = channel.Channel() if mode == 'memory' else None
+    sink = Sink()
+
+    c = cloud.Cloud(chan, sink)
+    c.left = bolt.BoltLine()
+    c.left.register_bolts({'runner': 'probe'})
+    c.right = bolt.BoltLine()
+    c.width = 1920
+    c.setup_renderer()
+    c.renderer.debounce = debounce
+
+    t = threading.Thread(None, c.start)
+    t.daemon = True
+    t.start()
+
+    storm = Storm(Formatter(), chan)
+    storm.setup()
+    storm.write('probe', 'warmup', False)
+    sink.wait_for('warmup')
+
+    latencies = []
+    for i in range(samples):
+        # Stay clear of the frame-rate cap
+        time.sleep(c.renderer.interval)
+
+        marker = 'sample-%d-%s' % (i, mode)
+        start = time.monotonic()
+        storm.write('probe', marker, False)
+        latencies.append(sink.wait_for(marker) - start)
+
+    latencies.sort()
+    return {
+        'p50': latencies[len(latencies) // 2],
+        'p99': latencies[int(len(latencies) * 0.99)],
+        'max': latencies[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--debounce', type=float, default=0.0)
+    args = parser.parse_args()
+
+    print('%-8s %10s %10s %10s' % ('mode', 'p50 ms', 'p99 ms', 'max ms'))
+    for mode in ('file', 'memory'):
+        r = measure(mode, args.samples, args.debounce)
+        print('%-8s %10.3f %10.3f %10.3f' % (
+            mode, r['p50'] * 1000, r['p99'] * 1000, r['max'] * 1000
+        ))
+
+
+if __name__ == '__main__':
+    main()
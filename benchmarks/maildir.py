@@ -0,0 +1,89 @@
+"""
+Cost per mail event of the maildir index vs. globbing the whole mail root
+
+Fills a temporary mail root with `--messages` unread messages spread over
+`--folders` folders, then times one delivery event against the old
+glob-and-filter count and against the index.
+
+    python -m benchmarks.maildir --messages 100000 --folders 50
+
+"""
+
+import os
+import glob
+import time
+import timeit
+import argparse
+import tempfile
+import pyinotify as inf
+from os.path import join
+
+from storm import maildir
+
+
+class Event():
+    def __init__(self, path, name, mask):
+        self.path = path
+        self.name = name
+        self.pathname = join(path, name)
+        self.mask = mask
+        self.dir = False
+
+
+def fill(root, messages, folders):
+    paths = []
+    for i in range(folders):
+        for sub in ('cur', 'new', 'tmp'):
+            os.makedirs(join(root, 'account', 'folder%02d' % i, sub))
+        paths.append(join(root, 'account', 'folder%02d' % i, 'new'))
+    os.makedirs(join(root, 'account', 'archive', 'new'))
+
+    for i in range(messages):
+        open(join(paths[i % folders], '%d.storm:2,' % i), 'w').close()
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--folders', type=int, default=50)
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='storm-maildir-')
+    start = time.monotonic()
+    paths = fill(root, args.messages, args.folders)
+    print('Created %d messages in %.1fs' % (
+        args.messages, time.monotonic() - start
+    ))
+
+    def old():
+        mail = glob.glob(join(root, '*/*/new/*'))
+        mail = filter(lambda m: '/archive/' not in m, mail)
+        return len(list(mail))
+
+    start = time.monotonic()
+    index = maildir.Index(root)
+    scan = time.monotonic() - start
+    assert index.count() == old() == args.messages
+
+    counter = [0]
+
+    def new():
+        counter[0] += 1
+        name = 'new-%d' % counter[0]
+        index.apply(Event(paths[counter[0] % len(paths)], name, inf.IN_CREATE))
+        return index.count()
+
+    results = (
+        ('glob', timeit.timeit(old, number=args.number) / args.number),
+        ('index', timeit.timeit(new, number=args.number) / args.number),
+    )
+
+    print('index scan on startup  %10.1f ms' % (scan * 1000))
+    for name, seconds in results:
+        print('%-22s %10.1f us/event' % (name, seconds * 1e6))
+
+
+if __name__ == '__main__':
+    main()
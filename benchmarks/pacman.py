@@ -0,0 +1,85 @@
+"""
+Cost of counting packages from the pacman databases
+
+Builds a fixture database with a local/ directory and a gzipped sync tarball,
+and times Packages.counts() on a cold cache (every database parsed again)
+and a warm one (nothing changed since the last call). `pacman -Q` is timed
+too when there is a pacman to run.
+
+    python -m benchmarks.pacman --packages 1500 --number 20
+
+"""
+
+import io
+import os
+import shutil
+import tarfile
+import timeit
+import argparse
+import tempfile
+import subprocess as sub
+
+from storm import pacman
+
+DESC = "%NAME%\n{0}\n\n%VERSION%\n{1}\n\n%DESC%\nA package\n\n"
+
+
+def fixture(root, count):
+    local = os.path.join(root, 'local')
+    sync = os.path.join(root, 'sync')
+    os.makedirs(sync)
+    os.makedirs(local)
+    with open(os.path.join(local, 'ALPM_DB_VERSION'), 'w') as fp:
+        fp.write('9\n')
+
+    with tarfile.open(os.path.join(sync, 'core.db'), 'w:gz') as tar:
+        for n in range(count):
+            name = 'package-%d' % n
+            version = '1.%d-1' % n
+            path = os.path.join(local, '%s-%s' % (name, version))
+            os.makedirs(path)
+            with open(os.path.join(path, 'desc'), 'w') as fp:
+                fp.write(DESC.format(name, version))
+
+            # Every tenth package has an update
+            if n % 10 == 0:
+                version = '1.%d-2' % n
+            data = DESC.format(name, version).encode()
+            info = tarfile.TarInfo('%s-%s/desc' % (name, version))
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--packages', type=int, default=1500)
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='storm-pacman-')
+    fixture(root, args.packages)
+
+    def cold():
+        pacman.Packages(root).counts()
+
+    warm = pacman.Packages(root)
+    print('counts: %s' % warm.counts())
+
+    results = [
+        ('cold', timeit.timeit(cold, number=args.number)),
+        ('warm', timeit.timeit(warm.counts, number=args.number)),
+    ]
+
+    if shutil.which('pacman'):
+        def query():
+            sub.Popen(['pacman', '-Q'], stdout=sub.PIPE).communicate()
+        results.append(('pacman', timeit.timeit(query, number=args.number)))
+
+    for name, seconds in results:
+        print('%-6s %10.1f ms/call' % (name, seconds / args.number * 1e3))
+
+    shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
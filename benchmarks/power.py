@@ -0,0 +1,91 @@
+"""
+Per-sample cost of the sysfs power source vs. forking acpi
+
+Builds a fake /sys/class/power_supply with two batteries and an adapter, and
+times PowerSupplies.sample() against running `acpi -ab` and parsing it with
+util.AcpiBattery the way the power source used to. A fake acpi script is
+used if there is no real one.
+
+    python -m benchmarks.power --number 200
+
+"""
+
+import os
+import stat
+import shutil
+import timeit
+import argparse
+import tempfile
+import subprocess as sub
+
+from storm import util
+from storm import sysfs
+
+SUPPLIES = {
+    'AC': {'type': 'Mains', 'online': '0'},
+    'BAT0': {
+        'type': 'Battery', 'status': 'Discharging', 'capacity': '64',
+        'energy_now': '30240000', 'energy_full': '47250000',
+        'power_now': '11900000',
+    },
+    'BAT1': {
+        'type': 'Battery', 'status': 'Discharging',
+        'charge_now': '2100000', 'charge_full': '4200000',
+        'current_now': '900000',
+    },
+}
+
+ACPI = """#!/bin/sh
+echo "Battery 0: Discharging, 64%, 02:32:28 remaining"
+echo "Battery 1: Discharging, 50%, 02:20:00 remaining"
+echo "Adapter 0: off-line"
+"""
+
+
+def fake_sysfs(root):
+    for name, attributes in SUPPLIES.items():
+        os.makedirs(os.path.join(root, name))
+        for attr, value in attributes.items():
+            with open(os.path.join(root, name, attr), 'w') as fp:
+                fp.write(value + '\n')
+
+
+def acpi_command(root):
+    if shutil.which('acpi'):
+        return 'acpi'
+
+    path = os.path.join(root, 'acpi')
+    with open(path, 'w') as fp:
+        fp.write(ACPI)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='storm-power-')
+    fake_sysfs(os.path.join(root, 'power_supply'))
+    command = acpi_command(root)
+
+    supplies = sysfs.PowerSupplies(os.path.join(root, 'power_supply'))
+    print('sysfs sample: %s' % supplies.sample())
+
+    def acpi():
+        out = sub.Popen([command, '-ab'], stdout=sub.PIPE)
+        lines = out.communicate()[0].decode().strip().split("\n")
+        for line in filter(lambda x: x.startswith('Battery'), lines):
+            util.AcpiBattery(line).parse()
+
+    results = (
+        ('acpi', timeit.timeit(acpi, number=args.number)),
+        ('sysfs', timeit.timeit(supplies.sample, number=args.number)),
+    )
+    for name, seconds in results:
+        print('%-6s %10.1f us/sample' % (name, seconds / args.number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Lines emitted and latency added by the render coalescing in the cloud
+
+Replays synthetic event bursts against a Renderer on a simulated clock and
+compares it with the old behaviour of emitting one line per event.
+
+    python -m benchmarks.render --fps 10 --debounce 0.02
+
+"""
+
+import random
+import argparse
+
+from storm.render import Renderer
+
+
+def collectors(seconds):
+    """
+    The interval collectors finishing a few ms apart on shared ticks
+
+    """
+
+    events = []
+    for second in range(seconds):
+        events.append((second + 0.001, 'date', second))
+        if second % 5 == 0:
+            events.append((second + 0.002, 'processes', second))
+            events.append((second + 0.003, 'mem_swap', second))
+        if second % 7 == 0:
+            events.append((second + 0.004, 'load', second))
+    return events
+
+
+def truncate_modify(seconds):
+    """
+    Non-atomic writes; one event for the truncate and one for the write
+
+    """
+
+    events = []
+    for t, name, value in collectors(seconds):
+        events.append((t, name, ''))
+        events.append((t + 0.0001, name, value))
+    return events
+
+
+def tag_flood(seconds):
+    """
+    herbstclient hooks while flipping through tags, 300 a second
+
+    """
+
+    rand = random.Random(0)
+    events = []
+    for i in range(seconds * 300):
+        tag = rand.randint(1, 9)
+        events.append((i / 300.0, 'tags', tag))
+        events.append((i / 300.0 + 0.0005, 'windowtitle', tag))
+    return events
+
+
+SCENARIOS = (
+    ('collectors', collectors),
+    ('truncate+modify', truncate_modify),
+    ('tag flood', tag_flood),
+)
+
+
+def simulate(events, fps, debounce):
+    now = [0.0]
+    state = {}
+    lines = []
+
+    def build():
+        return '|'.join('%s' % state[k] for k in sorted(state))
+
+    renderer = Renderer(
+        build, lines.append, fps=fps, debounce=debounce,
+        clock=lambda: now[0]
+    )
+
+    def advance(until):
+        while True:
+            due = renderer.due()
+            if due is None or due > until:
+                return
+            now[0] = due
+            renderer.poll()
+
+    for t, name, value in events:
+        advance(t)
+        now[0] = t
+        state[name] = value
+        renderer.request()
+
+    advance(float('inf'))
+    return renderer.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--seconds', type=int, default=60)
+    parser.add_argument('--fps', type=float, default=10)
+    parser.add_argument('--debounce', type=float, default=0.02)
+    args = parser.parse_args()
+
+    print('%-16s %10s %10s %10s %12s %12s' % (
+        'scenario', 'events/s', 'lines/s', 'saved/s',
+        'mean lat ms', 'max lat ms'
+    ))
+    for name, scenario in SCENARIOS:
+        events = scenario(args.seconds)
+        stats = simulate(events, args.fps, args.debounce)
+
+        before = len(events) / float(args.seconds)
+        after = stats['emitted'] / float(args.seconds)
+        print('%-16s %10.1f %10.1f %10.1f %12.1f %12.1f' % (
+            name, before, after, before - after,
+            stats['mean_latency'] * 1000, stats['max_latency'] * 1000
+        ))
+
+
+if __name__ == '__main__':
+    main()
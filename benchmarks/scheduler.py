@@ -0,0 +1,147 @@
+"""
+Thread count, RSS and wakeups of the threaded vs. the asyncio scheduler
+
+Each mode runs a fake storm, with the same intervals as the real sources, in
+a child process of its own for `--seconds`, after which the child reports on
+itself.
+
+    python -m benchmarks.scheduler --seconds 60
+
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import datetime
+import subprocess as sub
+import pyinotify as inf
+
+from benchmarks import REPO
+from storm import util
+from storm import scheduler
+from storm.storm import Hooker
+
+MODES = ('threads', 'asyncio')
+
+
+class FakeStorm():
+    hooker = Hooker()
+
+    def __init__(self):
+        self.writes = 0
+
+    def write(self, fn, data, output=True):
+        self.writes += 1
+
+    @hooker.interval(1)
+    def date(self):
+        return datetime.datetime.now().strftime("%H:%M:%S")
+
+    @hooker.interval(20)
+    def network(self):
+        return socket.gethostname()
+
+    @hooker.interval(5)
+    def load(self):
+        return os.getloadavg()
+
+    @hooker.interval(5)
+    def processes(self):
+        return len(os.listdir('/proc'))
+
+    @hooker.interval(5)
+    def mem_swap(self):
+        with open('/proc/meminfo') as fp:
+            return fp.read(64)
+
+    @hooker.interval(600)
+    def packages(self):
+        return 0
+
+    @hooker.interval(10)
+    def power(self):
+        return 100
+
+    @hooker.interval(3)
+    def volume(self):
+        return 71
+
+    @hooker.static
+    def hostname(self):
+        return socket.gethostname()
+
+    @hooker.static
+    def kernel(self):
+        return sub.check_output(['uname', '-r']).decode()
+
+    @hooker.inotify(os.environ['STORM_BENCHMARK'], inf.IN_MODIFY)
+    def mail(self):
+        return 0
+
+
+def child(mode, seconds):
+    storm = FakeStorm()
+    settings = {'scheduler': {'mode': mode, 'workers': 4}}
+
+    # The schedulers block or spawn non-daemon threads, so let them loose in
+    # a thread of their own and pull the plug from here.
+    runner = scheduler.get_scheduler(storm, settings)
+    t = threading.Thread(None, runner.start)
+    t.daemon = True
+    t.start()
+
+    # Let the static and first interval runs settle before measuring
+    time.sleep(1)
+    before = util.process_stats()
+    time.sleep(seconds)
+    after = util.process_stats()
+
+    result = {
+        'mode': mode,
+        'threads': after['threads'],
+        'rss_kb': after['rss'],
+        'wakeups_per_minute': round(
+            (after['wakeups'] - before['wakeups']) * 60.0 / seconds, 1
+        ),
+        'writes': storm.writes,
+    }
+    print(json.dumps(result))
+    sys.stdout.flush()
+    os._exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--child', choices=MODES)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.seconds)
+
+    results = []
+    for mode in MODES:
+        out = sub.check_output(
+            [
+                sys.executable, '-m', 'benchmarks.scheduler',
+                '--child', mode, '--seconds', str(args.seconds)
+            ],
+            cwd=REPO
+        )
+        results.append(json.loads(out.decode()))
+
+    print('%-8s %8s %10s %14s' % (
+        'mode', 'threads', 'rss (kB)', 'wakeups/min'
+    ))
+    for r in results:
+        print('%-8s %8d %10d %14.1f' % (
+            r['mode'], r['threads'], r['rss_kb'], r['wakeups_per_minute']
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+Cold-start time, steady-state RSS and threads of storm per process layout
+
+Starts storm against fake dzen2, xrandr, herbstclient and acpi binaries, and
+reports the time until the first line reaches dzen2, and the summed RSS and
+thread count of all storm processes after `--seconds`. Every layout is run
+with the full list of bolts from the shipped config, and the single process
+ones also with a minimal list of just a window title and a clock.
+
+    python -m benchmarks.startup --seconds 10
+
+"""
+
+import os
+import sys
+import time
+import stat
+import signal
+import argparse
+import tempfile
+import subprocess as sub
+
+from benchmarks import REPO
+from storm import util
+
+FAKES = {
+    'storm': """#!{python}
+import sys
+sys.path.insert(0, {repo!r})
+from storm.storm import main
+main()
+""",
+    'dzen2': """#!{python}
+import sys, time
+for line in sys.stdin:
+    if line.strip():
+        with open({firstline!r}, 'a') as fp:
+            fp.write('%f\\n' % time.time())
+        break
+for line in sys.stdin:
+    pass
+""",
+    'xrandr': """#!/bin/sh
+echo "eDP1 connected 1920x1080+0+0 (normal left inverted right) 309mm x 174mm"
+""",
+    'herbstclient': """#!/bin/sh
+case "$1" in
+    --idle) exec sleep 3600 ;;
+    tag_status) printf '\\t#1\\t:2\\t.3\\t' ;;
+esac
+""",
+    'acpi': """#!/bin/sh
+echo "Battery 0: Discharging, 64%, 02:11:00 remaining"
+echo "Adapter 0: off-line"
+""",
+}
+
+CONFIG = """
+process: {process}
+ipc: {ipc}
+{items}
+"""
+
+ITEMS = {
+    'full': '',
+    'minimal': """
+items:
+  left:
+    - runner: windowtitle
+  right:
+    - runner: date
+""",
+}
+
+LAYOUTS = (
+    ('split', 'file', 'full'),
+    ('single', 'file', 'full'),
+    ('single', 'memory', 'full'),
+    ('single', 'file', 'minimal'),
+    ('single', 'memory', 'minimal'),
+)
+
+
+def install_fakes(bindir, firstline):
+    for name, script in FAKES.items():
+        path = os.path.join(bindir, name)
+        with open(path, 'w') as fp:
+            fp.write(script.format(
+                python=sys.executable, repo=REPO, firstline=firstline
+            ))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+
+
+def storm_pids(script):
+    """
+    All processes that run the storm wrapper script
+
+    """
+
+    pids = []
+    for pid in filter(str.isdigit, os.listdir('/proc')):
+        try:
+            with open('/proc/%s/cmdline' % pid, 'rb') as fp:
+                cmdline = fp.read().split(b'\0')
+        except OSError:
+            continue
+        if script.encode() in cmdline:
+            pids.append(pid)
+    return pids
+
+
+def measure(process, ipc, items, seconds):
+    root = tempfile.mkdtemp(prefix='storm-startup-')
+    bindir = os.path.join(root, 'bin')
+    os.makedirs(os.path.join(root, 'config', 'storm'))
+    os.makedirs(bindir)
+
+    firstline = os.path.join(root, 'firstline')
+    install_fakes(bindir, firstline)
+    with open(os.path.join(root, 'config', 'storm', 'config.yml'), 'w') as fp:
+        fp.write(CONFIG.format(process=process, ipc=ipc, items=ITEMS[items]))
+
+    env = dict(os.environ)
+    env['PATH'] = bindir + os.pathsep + env['PATH']
+    env['XDG_CONFIG_HOME'] = os.path.join(root, 'config')
+    env['XDG_CACHE_HOME'] = os.path.join(root, 'cache')
+
+    script = os.path.join(bindir, 'storm')
+    start = time.time()
+    proc = sub.Popen(
+        [script], env=env, start_new_session=True,
+        stdout=sub.DEVNULL, stderr=sub.DEVNULL
+    )
+
+    try:
+        while not os.path.exists(firstline):
+            if time.time() - start > 30:
+                raise RuntimeError('No line from storm after 30s')
+            time.sleep(0.005)
+        with open(firstline) as fp:
+            cold = float(fp.readline()) - start
+
+        pids = storm_pids(script)
+        before = [util.process_stats(pid) for pid in pids]
+        time.sleep(seconds)
+        stats = [util.process_stats(pid) for pid in pids]
+    finally:
+        os.killpg(proc.pid, signal.SIGKILL)
+
+    return {
+        'cold': cold,
+        'processes': len(pids),
+        'rss': sum(s['rss'] for s in stats),
+        'threads': sum(s['threads'] for s in stats),
+        'cpu_percent': 100 * sum(
+            a['cpu'] - b['cpu'] for a, b in zip(stats, before)
+        ) / seconds,
+        'wakeups_per_second': sum(
+            a['wakeups'] - b['wakeups'] for a, b in zip(stats, before)
+        ) / seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    print('%-8s %-8s %-8s %12s %10s %8s %10s' % (
+        'process', 'ipc', 'items', 'cold start s', 'processes', 'threads',
+        'rss (kB)'
+    ))
+    for process, ipc, items in LAYOUTS:
+        r = measure(process, ipc, items, args.seconds)
+        print('%-8s %-8s %-8s %12.3f %10d %8d %10d' % (
+            process, ipc, items, r['cold'], r['processes'], r['threads'],
+            r['rss']
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+"""
+Synthetic loads that push storm to where it saturates
+
+Every scenario runs in a child process of its own, against stand-ins only:
+a channel and a cloud that writes into a sink, a fake herbstclient, and
+temporary maildirs.
+
+    bolts      50 bolts per side, written to as fast as possible
+    hlwm       a herbstclient that emits 1000 hooks per second
+    maildir    10000 messages that arrive in one burst
+    intervals  20 collectors that run every 100ms
+
+For each one it reports the throughput, how many updates were coalesced on
+the way to the bar, the deepest the channel got, and the CPU use and memory
+growth of the process over time.
+
+    python -m benchmarks.stress --seconds 10
+    python -m benchmarks.stress maildir --messages 50000
+
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess as sub
+from collections import OrderedDict
+
+from benchmarks import REPO
+from benchmarks import hlwm as fake_hlwm
+from benchmarks.ipc import Sink
+from storm import bolt
+from storm import channel
+from storm import cloud
+from storm import conf
+from storm import hlwm
+from storm import metrics
+from storm import scheduler
+from storm import storm
+from storm import util
+
+
+class CountingChannel(channel.Channel):
+    """
+    A channel that counts what goes in and out, and how deep it gets
+
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.published = 0
+        self.received = 0
+        self.depth = 0
+
+    def publish(self, name, text):
+        super().publish(name, text)
+        with self.lock:
+            self.published += 1
+            self.depth = max(self.depth, len(self.pending))
+
+    def drain(self):
+        pending = super().drain()
+        self.received += len(pending)
+        return pending
+
+
+class Monitor():
+    """
+    Samples the CPU time and RSS of this process every `period` seconds
+
+    """
+
+    def __init__(self, period=0.5):
+        self.period = period
+        self.samples = []
+        self.done = threading.Event()
+
+    def sample(self):
+        stats = util.process_stats()
+        self.samples.append((time.monotonic(), stats['cpu'], stats['rss']))
+
+    def run(self):
+        while not self.done.wait(self.period):
+            self.sample()
+
+    def start(self):
+        self.sample()
+        t = threading.Thread(None, self.run)
+        t.daemon = True
+        t.start()
+
+    def stop(self):
+        self.done.set()
+        self.sample()
+
+        (t0, cpu0, rss0), (t1, cpu1, rss1) = self.samples[0], self.samples[-1]
+        elapsed = t1 - t0
+        return {
+            'cpu_percent': 100 * (cpu1 - cpu0) / elapsed,
+            'rss_start_kb': rss0,
+            'rss_max_kb': max(s[2] for s in self.samples),
+            'rss_end_kb': rss1,
+            'rss_growth_kb_per_min': (rss1 - rss0) * 60 / elapsed,
+        }
+
+
+def pipeline(left, right=()):
+    """
+    A storm and a cloud on a counting channel, the cloud in a thread
+
+    """
+
+    chan = CountingChannel()
+    c = cloud.Cloud(chan, Sink())
+    c.left = bolt.BoltLine()
+    c.left.register_bolts(*({'runner': name} for name in left))
+    c.right = bolt.BoltLine()
+    c.right.register_bolts(*({'runner': name} for name in right))
+    c.width = 1920
+    c.setup_renderer()
+
+    t = threading.Thread(None, c.start)
+    t.daemon = True
+    t.start()
+
+    return storm.Storm(storm.StormFormatter(), chan), c
+
+
+def delivery(s, c):
+    # Let the cloud catch up with the last writes
+    time.sleep(0.5)
+
+    render = metrics.registry.histograms.get('cloud.render')
+    return {
+        'writes': sum(s.writes.values()),
+        'skipped_unchanged': sum(s.skips.values()),
+        'received_by_cloud': c.channel.received,
+        'coalesced': c.channel.published - c.channel.received,
+        'max_queue_depth': c.channel.depth,
+        'lines_emitted': c.renderer.emitted,
+        'render_p99_ms': render.quantile(0.99) * 1e3 if render else 0,
+    }
+
+
+def bolts(args):
+    names = ['b%d' % i for i in range(2 * args.bolts)]
+    s, c = pipeline(names[:args.bolts], names[args.bolts:])
+    counter = [0]
+    end = time.monotonic() + args.seconds
+
+    def writer(seed):
+        rand = random.Random(seed)
+        while time.monotonic() < end:
+            counter[0] += 1
+            s.write(rand.choice(names), counter[0], False)
+
+    threads = [
+        threading.Thread(None, writer, args=(i,)) for i in range(args.writers)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    result = {'writes_per_s': counter[0] / args.seconds}
+    result.update(delivery(s, c))
+    return result
+
+
+def hooks(args):
+    s, c = pipeline(['tags', 'windowtitle'])
+
+    root = tempfile.mkdtemp(prefix='storm-stress-')
+    options = argparse.Namespace(
+        lines=int(args.hook_rate * args.seconds),
+        burst=max(1, args.hook_rate // 100),
+        gap=0.01
+    )
+    command, spawns = fake_hlwm.install_fake(root, options)
+
+    client = hlwm.Client(command)
+    listener = hlwm.IdleListener(command)
+    listener.subscribe(
+        ('tag_changed', 'tag_flags'),
+        lambda hook: s.write('tags', client.call('tag_status'), False)
+    )
+    listener.subscribe(
+        ('focus_changed', 'window_title_changed'),
+        lambda hook: s.write('windowtitle', hook[-1], False)
+    )
+
+    start = time.monotonic()
+    listener.run()
+    elapsed = time.monotonic() - start
+
+    with open(spawns) as fp:
+        spawned = len(fp.read())
+
+    result = {
+        'hooks': listener.lines,
+        'hooks_per_s': listener.lines / elapsed,
+        'batches': listener.batches,
+        'dispatched': listener.dispatched,
+        'coalesced_hooks': listener.lines - listener.dispatched,
+        'tag_status_runs': spawned,
+    }
+    result.update(delivery(s, c))
+    return result
+
+
+def maildir(args):
+    root = tempfile.mkdtemp(prefix='storm-stress-')
+    new = os.path.join(root, 'account', 'INBOX', 'new')
+    for sub_dir in ('new', 'cur', 'tmp'):
+        os.makedirs(os.path.join(root, 'account', 'INBOX', sub_dir))
+    conf.CONFIG['mail']['mailroot'] = root
+
+    s, c = pipeline(['mail'])
+    runner = scheduler.ThreadScheduler(s, report=0, names={'mail'})
+    t = threading.Thread(None, runner.start)
+    t.daemon = True
+    t.start()
+    while 'mail' not in s.data:
+        time.sleep(0.01)
+    events = s.mail_index.events
+
+    start = time.monotonic()
+    for i in range(args.messages):
+        with open(os.path.join(new, '%d.stress:2,' % i), 'w'):
+            pass
+    burst = time.monotonic() - start
+
+    deadline = start + args.seconds + 30
+    while s.data.get('mail') != args.messages:
+        if time.monotonic() > deadline:
+            break
+        time.sleep(0.01)
+    settled = time.monotonic() - start
+
+    runs = metrics.registry.histograms['run.mail']
+    result = {
+        'messages': args.messages,
+        'burst_s': burst,
+        'settled_s': settled,
+        'lost': args.messages - (s.data.get('mail') or 0),
+        'inotify_events': s.mail_index.events - events,
+        'rescans': s.mail_index.scans - 1,
+        'source_runs': runs.count,
+        'source_p99_ms': runs.quantile(0.99) * 1e3,
+    }
+    result.update(delivery(s, c))
+    return result
+
+
+def intervals(args):
+    hooker = storm.Hooker()
+    attrs = {'hooker': hooker}
+    names = ['c%d' % i for i in range(args.collectors)]
+    for name in names:
+        def collect(self):
+            return time.monotonic()
+        attrs[name] = hooker.interval(args.interval)(collect)
+    Collectors = type('Collectors', (storm.Storm,), attrs)
+
+    s, c = pipeline(names[::2], names[1::2])
+    s = Collectors(s.formatter, s.channel)
+    runner = scheduler.ThreadScheduler(s, report=0, names=set(names))
+    start = time.monotonic()
+    t = threading.Thread(None, runner.start)
+    t.daemon = True
+    t.start()
+
+    time.sleep(args.seconds)
+    delivered = delivery(s, c)
+    elapsed = time.monotonic() - start
+
+    runs = sum(
+        h.count for name, h in metrics.registry.histograms.items()
+        if name.startswith('run.c')
+    )
+    stats = runner.stats()
+    result = {
+        'expected_runs': int(args.collectors * elapsed / args.interval),
+        'runs': runs,
+        'overruns': sum(stats['overruns'].values()),
+        'timer_wakeups': runner.wheel.wakeups,
+    }
+    result.update(delivered)
+    return result
+
+
+SCENARIOS = OrderedDict((
+    ('bolts', bolts),
+    ('hlwm', hooks),
+    ('maildir', maildir),
+    ('intervals', intervals),
+))
+
+
+def child(args):
+    monitor = Monitor()
+    monitor.start()
+    result = SCENARIOS[args.child](args)
+    result.update(monitor.stop())
+
+    print(json.dumps(result))
+    sys.stdout.flush()
+    # The schedulers and clouds leave non-daemon threads behind
+    os._exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('scenarios', nargs='*', metavar='SCENARIO')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--bolts', type=int, default=50)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--hook-rate', type=int, default=1000)
+    parser.add_argument('--messages', type=int, default=10000)
+    parser.add_argument('--collectors', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.1)
+    parser.add_argument('--child', choices=SCENARIOS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error('unknown scenarios: %s' % ', '.join(sorted(unknown)))
+
+    options = [a for a in sys.argv[1:] if a not in args.scenarios]
+    for scenario in args.scenarios or SCENARIOS:
+        command = [sys.executable, '-m', 'benchmarks.stress']
+        command += ['--child', scenario] + options
+        out = sub.check_output(command, cwd=REPO)
+        result = json.loads(out.decode().strip().splitlines()[-1])
+
+        print('== %s' % scenario)
+        for key, value in result.items():
+            if isinstance(value, float):
+                print('  %-24s %12.2f' % (key, value))
+            else:
+                print('  %-24s %12s' % (key, value))
+        print('')
+
+
+if __name__ == '__main__':
+    main()
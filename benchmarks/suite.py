@@ -0,0 +1,266 @@
+"""
+All micro and macro benchmarks in one run, saved as JSON and compared
+
+Micro cases time the hot functions one call at a time: every StormFormatter
+method, BoltLine compile() and width(), the time helpers of util,
+AcpiBattery.parse() and conf.load() with and without its snapshot. Macro
+cases run the pipeline as a whole, with fake sources and a sink in place of
+dzen2: the updates per second that Storm.write() and a cloud sustain, the
+latency from a write to the emitted line, and the CPU, wakeups and RSS of a
+full storm against fake binaries while it idles.
+
+Save a run as the baseline, then compare later runs against it; a case that
+got worse by more than `--tolerance` is a regression, and makes the exit
+status 1.
+
+    python -m benchmarks.suite --save baseline.json
+    python -m benchmarks.suite --baseline baseline.json
+
+"""
+
+import os
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+import itertools
+import threading
+
+from benchmarks import ipc
+from benchmarks import startup
+from benchmarks.formatter import DATA
+from storm import bolt
+from storm import channel
+from storm import cloud
+from storm import conf
+from storm import util
+from storm import storm
+
+VERSION = 1
+
+SAMPLE = (
+    "^fg(#a8c410)^bg(#111117)^i(/usr/share/storm/icons/cpu.xbm)^fg()^bg() "
+    "^fg(#9d9d9d)^bg(#111117)%d^fg()^bg()"
+)
+
+
+def result(value, unit, better='lower'):
+    return {'value': value, 'unit': unit, 'better': better}
+
+
+def per_call(function, number):
+    """
+    Microseconds per call, best of three
+
+    """
+
+    best = min(timeit.repeat(function, number=number, repeat=3))
+    return result(best / number * 1e6, 'us')
+
+
+def micro_formatter(number):
+    formatter = storm.StormFormatter()
+    results = {}
+    for name, examples in DATA.items():
+        method = getattr(formatter, name)
+        data = itertools.cycle(examples)
+        results['format.%s' % name] = per_call(
+            lambda: method(next(data)), number
+        )
+    return results
+
+
+def micro_boltline(number, bolts=24):
+    line = bolt.BoltLine()
+    line.register_bolts(*({'runner': 'b%d' % i} for i in range(bolts)))
+    for i, b in enumerate(line.bolts):
+        b.set(SAMPLE % i)
+
+    counter = itertools.count()
+
+    def event():
+        line.update('b3', SAMPLE % next(counter))
+        line.compile()
+
+    def width():
+        line.update('b3', SAMPLE % next(counter))
+        line.width()
+
+    return {
+        'boltline.compile': per_call(event, number),
+        'boltline.width': per_call(width, number),
+    }
+
+
+def micro_util(number):
+    battery = "Battery 0: Discharging, 64%, 02:11:00 remaining"
+    return {
+        'util.humanize_time': per_call(
+            lambda: util.humanize_time(5025, 'seconds'), number
+        ),
+        'util.time_left': per_call(lambda: util.time_left(5025), number),
+        'util.AcpiBattery.parse': per_call(
+            lambda: util.AcpiBattery(battery).parse(), number
+        ),
+    }
+
+
+def micro_conf(number):
+    conf.load()
+
+    def yaml():
+        os.unlink(conf.SNAPSHOT)
+        conf.load()
+
+    # The YAML path is slow enough that fewer calls do
+    return {
+        'conf.load.snapshot': per_call(conf.load, number),
+        'conf.load.yaml': per_call(yaml, max(1, number // 100)),
+    }
+
+
+def macro_throughput(seconds, bolts=24):
+    """
+    Writes per second that a storm and a cloud on a channel keep up with
+
+    """
+
+    chan = channel.Channel()
+    sink = ipc.Sink()
+
+    c = cloud.Cloud(chan, sink)
+    c.left = bolt.BoltLine()
+    c.left.register_bolts(*({'runner': 'b%d' % i} for i in range(bolts)))
+    c.right = bolt.BoltLine()
+    c.width = 1920
+    c.setup_renderer()
+
+    t = threading.Thread(None, c.start)
+    t.daemon = True
+    t.start()
+
+    s = storm.Storm(ipc.Formatter(), chan)
+    writes = 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        s.write('b%d' % (writes % bolts), writes, False)
+        writes += 1
+
+    # Let the cloud catch up before counting what it took in
+    time.sleep(0.2)
+    return {
+        'pipeline.updates': result(writes / seconds, 'writes/s', 'higher'),
+        'pipeline.lines': result(
+            c.renderer.emitted / seconds, 'lines/s', 'higher'
+        ),
+    }
+
+
+def macro_latency(samples):
+    results = {}
+    for mode in ('file', 'memory'):
+        r = ipc.measure(mode, samples, 0.0)
+        for key in ('p50', 'p99'):
+            results['latency.%s.%s' % (mode, key)] = result(
+                r[key] * 1e3, 'ms'
+            )
+    return results
+
+
+def macro_idle(seconds):
+    r = startup.measure('single', 'memory', 'full', seconds)
+    return {
+        'idle.cpu': result(r['cpu_percent'], '%'),
+        'idle.wakeups': result(r['wakeups_per_second'], 'wakeups/s'),
+        'idle.rss': result(r['rss'], 'kB'),
+        'idle.threads': result(r['threads'], 'threads'),
+    }
+
+
+def run(args):
+    results = {}
+    if args.only in (None, 'micro'):
+        results.update(micro_formatter(args.number))
+        results.update(micro_boltline(args.number))
+        results.update(micro_util(args.number))
+        results.update(micro_conf(args.number))
+    if args.only in (None, 'macro'):
+        results.update(macro_throughput(args.seconds))
+        results.update(macro_latency(args.samples))
+        results.update(macro_idle(args.idle_seconds))
+
+    return {
+        'version': VERSION,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """
+    Print every case against the baseline; returns the regressed ones
+
+    """
+
+    regressions = []
+    print('%-28s %12s %12s %9s' % ('case', 'baseline', 'now', 'change'))
+    for name, now in sorted(current['results'].items()):
+        before = baseline['results'].get(name)
+        if before is None or not before['value']:
+            print('%-28s %12s %12.2f %9s' % (name, '-', now['value'], 'new'))
+            continue
+
+        change = (now['value'] - before['value']) / before['value']
+        worse = change if now['better'] == 'lower' else -change
+        flag = ''
+        if worse > tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+
+        print('%-28s %12.2f %12.2f %+8.1f%%%s' % (
+            name, before['value'], now['value'], change * 100, flag
+        ))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--only', choices=('micro', 'macro'))
+    parser.add_argument('--number', type=int, default=20000)
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--samples', type=int, default=100)
+    parser.add_argument('--idle-seconds', type=float, default=60)
+    parser.add_argument('--save', metavar='FILE')
+    parser.add_argument('--baseline', metavar='FILE')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    current = run(args)
+
+    if args.save:
+        with open(args.save, 'w') as fp:
+            json.dump(current, fp, indent=2, sort_keys=True)
+
+    if not args.baseline:
+        for name, r in sorted(current['results'].items()):
+            print('%-28s %12.2f %s' % (name, r['value'], r['unit']))
+        return
+
+    with open(args.baseline) as fp:
+        baseline = json.load(fp)
+    if baseline.get('version') != VERSION:
+        sys.exit('%s is not a version %d baseline' % (args.baseline, VERSION))
+
+    regressions = compare(current, baseline, args.tolerance)
+    if regressions:
+        sys.exit('%d regressions: %s' % (
+            len(regressions), ', '.join(regressions)
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Latency and idle cost of the event-driven volume source
+
+Runs the volume source the way the threaded scheduler does, on the poll
+descriptors of two fake mixers, and publishes into an in-memory channel.
+Times a change of the fake mixer until the bolt comes out of the channel,
+then counts the wakeups of the process while nothing changes.
+
+    python -m benchmarks.volume --number 200 --idle 5
+
+"""
+
+import time
+import select
+import argparse
+import threading
+
+from storm import channel
+from storm import mixer
+from storm import scheduler
+from storm import storm
+from storm import util
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--number', type=int, default=200)
+    parser.add_argument('--idle', type=float, default=5)
+    args = parser.parse_args()
+
+    chan = channel.Channel()
+    bar = storm.Storm(storm.StormFormatter(), channel=chan)
+    volume, master = mixer.FakeMixer(), mixer.FakeMixer()
+    bar.mixers = mixer.Mixers(mixer=volume, master=master)
+
+    sched = scheduler.ThreadScheduler(bar)
+    sources = [s for s in bar.volume.sources if s['kind'] == 'event']
+    thread = threading.Thread(
+        None, sched.run_event, args=('volume', bar.volume, sources)
+    )
+    thread.daemon = True
+    thread.start()
+
+    latencies = []
+    for n in range(args.number):
+        start = time.perf_counter()
+        volume.set(volume=n % 100)
+        select.select([chan], [], [])
+        chan.drain()
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    print('change to bolt: p50 %.3f ms, p99 %.3f ms' % (
+        latencies[len(latencies) // 2] * 1e3,
+        latencies[int(len(latencies) * 0.99)] * 1e3,
+    ))
+
+    before = util.process_stats()['wakeups']
+    time.sleep(args.idle)
+    # Our own sleep ending is one of them
+    wakeups = util.process_stats()['wakeups'] - before - 1
+    print('idle: %d wakeups in %.0fs' % (wakeups, args.idle))
+
+
+if __name__ == '__main__':
+    main()
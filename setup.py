@@ -8,6 +8,7 @@ setup(
     author_email='lowe.thiderman@gmail.com, niclas.helbro@gmail.com',
     description=('inotify-based dzen2 runner'),
     license='MIT',
+    python_requires='>=3.8',
     entry_points={
         'console_scripts': [
             'storm = storm.storm:main'
@@ -4,33 +4,132 @@ from os.path import join
 from storm import util
 from storm import conf
 
+# dzen markup, i.e. ^fg(#ffffff), ^i(/path/to/icon.xbm) and ^fg()
+MARKUP = re.compile(r'\^[^(]*([^)]*).')
+
+
+def visible_length(text):
+    return len(MARKUP.sub('', text))
+
 
 class BoltLine(util.LoggedClass):
-    separator = " ^bg()^fg(%s)|^fg()^bg() " % conf.CONFIG['colors']['sep']
+    """
+    A line of bolts, joined by a separator
+
+    The text and visible length of every bolt is cached, and the line is only
+    joined again after a bolt has actually changed.
+
+    """
 
     def __init__(self):
+        self.separator = " ^bg()^fg(%s)|^fg()^bg() " % (
+            conf.CONFIG['colors']['sep']
+        )
         self.bolts = []
+        self.index = {}
+        self.line = None
+        self.chars = 0
         super().__init__()
 
     def register_bolts(self, *bolts):
         for data in bolts:
             bolt = Bolt(**data)
             self.bolts.append(bolt)
+            self.index[bolt.runner] = bolt
+        self.line = None
+
+    def update(self, name, text=None):
+        """
+        Update the bolt called `name`, if it is on this line
+
+        The bolt is re-read from its file unless the `text` is given. Returns
+        True if the line changed.
+
+        """
+
+        bolt = self.index.get(name)
+        if bolt is None:
+            return False
+
+        changed = bolt.refresh() if text is None else bolt.set(text)
+        if not changed:
+            return False
+
+        self.line = None
+        return True
+
+    def refresh(self):
+        for bolt in self.bolts:
+            bolt.refresh()
+        self.line = None
+
+    def adopt(self, *lines):
+        """
+        Take over the texts of the bolts of the same name on other lines
+
+        For a line that replaces `lines` after a config reload. Returns the
+        bolts that had no text to take over.
+
+        """
+
+        texts = {}
+        for line in lines:
+            for bolt in line.bolts:
+                texts[bolt.runner] = bolt.text
+
+        missing = []
+        for bolt in self.bolts:
+            if bolt.runner in texts:
+                bolt.set(texts[bolt.runner])
+            else:
+                missing.append(bolt)
+        self.line = None
+        return missing
 
     def compile(self):
-        return self.separator.join(b.read() for b in self.bolts)
+        if self.line is None:
+            self.line = self.separator.join(b.text for b in self.bolts)
+            self.chars = sum(b.chars for b in self.bolts)
+            if self.bolts:
+                seps = len(self.bolts) - 1
+                self.chars += seps * visible_length(self.separator)
+        return self.line
 
     def width(self):
-        text_only = re.sub('\^[^(]*([^)]*).', '', self.compile())
-        return len(text_only) * conf.CONFIG['font']['width']
+        self.compile()
+        return self.chars * conf.CONFIG['font']['width']
 
 
 class Bolt(util.LoggedClass):
     def __init__(self, **kwargs):
         self._in = kwargs
         self.__dict__.update(kwargs)
-        self.fd = open(join(conf.ROOT, self.runner))
+        self.path = join(conf.ROOT, self.runner)
+
+        self.text = ''
+        self.chars = 0
 
     def read(self):
-        self.fd.seek(0)
-        return self.fd.read()
+        # Storm replaces the files instead of rewriting them, so an open file
+        # would keep pointing at the old contents.
+        try:
+            with open(self.path) as fp:
+                return fp.read()
+        except FileNotFoundError:
+            return ''
+
+    def refresh(self):
+        """
+        Re-read the file; returns True if the text changed
+
+        """
+
+        return self.set(self.read())
+
+    def set(self, text):
+        if text == self.text:
+            return False
+
+        self.text = text
+        self.chars = visible_length(text)
+        return True
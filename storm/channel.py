@@ -0,0 +1,58 @@
+import os
+import threading
+
+from collections import OrderedDict
+
+from storm import util
+
+
+class Channel(util.LoggedClass):
+    """
+    Hands rendered bolts from Storm to the Cloud within one process
+
+    This replaces the files in the cache directory and the inotify watch on
+    them. Only the latest text per bolt is kept, so a consumer that falls
+    behind skips straight to the current values. Wakeups go over a pipe, so
+    the consumer can select() on the channel next to other descriptors.
+
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = OrderedDict()
+
+        self.rfd, self.wfd = os.pipe()
+        os.set_blocking(self.rfd, False)
+        os.set_blocking(self.wfd, False)
+
+        super().__init__()
+
+    def fileno(self):
+        return self.rfd
+
+    def publish(self, name, text):
+        with self.lock:
+            wake = not self.pending
+            self.pending[name] = text
+
+        # One byte per batch is enough; the consumer drains everything.
+        if wake:
+            try:
+                os.write(self.wfd, b'\0')
+            except BlockingIOError:
+                pass
+
+    def drain(self):
+        """
+        Take everything published since the last drain, as {name: text}
+
+        """
+
+        with self.lock:
+            pending, self.pending = self.pending, OrderedDict()
+            try:
+                os.read(self.rfd, 4096)
+            except BlockingIOError:
+                pass
+
+        return pending
@@ -1,31 +1,49 @@
 import sys
-import pyinotify as inf
-import asyncore
-import logbook
+import selectors
+
+from os.path import basename
 
 from storm import util
 from storm import conf
 from storm import bolt
+from storm import drm
+from storm import inotify
+from storm import metrics
+from storm import render
+from storm import trace
+from storm import uevent
 
 
-class Cloud(inf.ProcessEvent):
+class Cloud(util.LoggedClass):
     """
     The representation layer
 
     This class is solely concerned with watching the data directory for
     changes, and send a newly constructed line into dzen upon changes.
 
+    If it is given a channel, the bolts are taken from that one instead of
+    from the data directory.
+
     """
 
-    def __init__(self, *args, **kwargs):
-        # TODO: get LoggedClass to roll with multiple inheritance.
-        name = self.__class__.__name__
-        self.log = logbook.Logger(name)
-        self.log.debug('Loaded logger for {0}', name)
+    def __init__(self, channel=None, out=None):
+        self.channel = channel
+        self.out = out or sys.stdout
+        self.selector = selectors.DefaultSelector()
+
+        # Names of the bolts that changed since the last render
+        self.dirty = set()
+
+        # No DRM output to follow until get_screen_width() finds one
+        self.screens = None
+        self.hotplug = None
+
+        super().__init__()
 
     def setup(self):
         self.setup_lines()
         self.get_screen_width()
+        self.setup_renderer()
 
     def setup_lines(self):
         self.left = bolt.BoltLine()
@@ -34,36 +52,221 @@ class Cloud(inf.ProcessEvent):
         self.right = bolt.BoltLine()
         self.right.register_bolts(*conf.CONFIG['items']['right'])
 
+    def setup_renderer(self):
+        settings = conf.CONFIG.get('render', {})
+        self.renderer = render.Renderer(
+            self.compile,
+            self.emit,
+            fps=settings.get('fps', 10),
+            debounce=settings.get('debounce', 0.02)
+        )
+        metrics.registry.provide('renderer', self.renderer.stats)
+
     def get_screen_width(self):
-        self.width = util.get_screen_size()
+        output = conf.CONFIG.get('screen', {}).get('output')
+        self.screens = drm.Screens(output=output)
+        try:
+            names = self.screens.names()
+        except OSError:
+            names = []
+
+        if not names:
+            # No DRM connectors to go by, so there will be no hotplug events
+            # either; the geometry is fixed at what xrandr says.
+            self.log.warning('No DRM output found, asking xrandr instead')
+            self.screens = None
+            self.width = util.get_screen_size(output)
+            return
+
+        geometry = self.screens.geometry()
+        if geometry is None:
+            # Not plugged in yet, e.g. when starting undocked; the width is
+            # taken from the hotplug event once it is.
+            self.log.warning(
+                'Output {0} is not connected, asking xrandr for now', output
+            )
+            self.width = util.get_screen_size(output)
+            return
+
+        self.width = geometry[0]
 
     def process_default(self, event):
+        with metrics.registry.timer('cloud.process_default'):
+            self.handle(event)
+
+    def handle(self, event):
+        if event and event.mask & inotify.IN_Q_OVERFLOW:
+            self.log.warning('inotify queue overflow, reading all bolts')
+            self.left.refresh()
+            self.right.refresh()
+            self.renderer.request()
+            return
+
+        if event and basename(event.pathname).startswith('.'):
+            # Temporary files of atomic writes
+            return
+
         if event and 'debug' in conf.CONFIG:
             self.log.debug('{0} on: {1}', event.maskname, event.pathname)
 
-        spacer = "^pa(%d)" % (self.width - self.right.width() - 90)
-        line = "%s%s%s" % (self.left.compile(), spacer, self.right.compile())
+        if event:
+            trace.record(
+                'inotify', name=basename(event.pathname), mask=event.mask
+            )
+            self.dirty.add(basename(event.pathname))
+        self.renderer.request()
+
+    def compile(self):
+        with metrics.registry.timer('cloud.render'):
+            # Only the bolts that had events are read again.
+            while self.dirty:
+                name = self.dirty.pop()
+                self.left.update(name)
+                self.right.update(name)
 
+            spacer = "^pa(%d)" % (self.width - self.right.width() - 90)
+            return "%s%s%s" % (
+                self.left.compile(), spacer, self.right.compile()
+            )
+
+    def emit(self, line):
         assert '\n' not in line, 'Line break in output'
 
-        sys.stdout.write('\n' + line)
-        sys.stdout.flush()
+        self.out.write('\n' + line)
+        self.out.flush()
+        metrics.registry.count('cloud.lines')
 
-    def start(self):
-        mask = inf.IN_DELETE | inf.IN_CREATE | inf.IN_MODIFY
+    def watch_files(self):
+        # Only the file ipc needs pyinotify, so it is only loaded for it
+        import pyinotify as inf
+
+        mask = (
+            inotify.IN_DELETE | inotify.IN_MOVED_TO | inotify.IN_CLOSE_WRITE
+        )
         wm = inf.WatchManager()
-        inf.AsyncNotifier(wm, self)
+        self.notifier = inf.Notifier(wm, self.process_default)
         wm.add_watch(conf.ROOT, mask, rec=True)
+        self.selector.register(
+            wm.get_fd(), selectors.EVENT_READ, self.read_files
+        )
+
+        # Run the initial grab of data, in case anything changed before the
+        # watch was in place
+        self.left.refresh()
+        self.right.refresh()
+
+    def read_files(self):
+        self.notifier.read_events()
+        self.notifier.process_events()
+
+    def watch_channel(self):
+        self.selector.register(
+            self.channel, selectors.EVENT_READ, self.read_channel
+        )
+
+    def read_channel(self):
+        for name, text in self.channel.drain().items():
+            self.left.update(name, text)
+            self.right.update(name, text)
+        self.renderer.request()
+
+    def watch_screen(self):
+        if self.screens is None or self.hotplug is not None:
+            return
+
+        try:
+            self.hotplug = uevent.Monitor('drm')
+        except OSError:
+            self.log.exception('Cannot watch for monitor hotplugs')
+            return
+
+        self.selector.register(
+            self.hotplug.fds()[0], selectors.EVENT_READ, self.read_screen
+        )
+
+    def read_screen(self):
+        # The connectors are only read again on drm events, and the line is
+        # only rendered again if the width actually changed.
+        if not self.hotplug.read() or self.screens is None:
+            return
+
+        try:
+            geometry = self.screens.geometry()
+        except OSError:
+            self.log.exception('Cannot read the DRM connectors')
+            return
+
+        if geometry is None or geometry[0] == self.width:
+            return
+
+        self.log.info('Screen width changed to {0}', geometry[0])
+        self.width = geometry[0]
+        self.renderer.request()
+
+    def watch_config(self):
+        try:
+            reloader = conf.Reloader()
+        except (OSError, ImportError):
+            self.log.exception('Cannot watch the config for changes')
+            return None
+
+        self.selector.register(
+            reloader.fds()[0], selectors.EVENT_READ, reloader.read
+        )
+        reloader.subscribe(self.reload)
+        return reloader
+
+    def reload(self, old, new, changed):
+        """
+        Rebuild what the changed sections of the config are used for
+
+        The bolts on the new lines keep the texts they had on the old ones, so
+        that nothing has to be collected again.
+
+        """
+
+        if changed.intersection(('items', 'colors', 'font')):
+            left, right = self.left, self.right
+            self.setup_lines()
+
+            missing = (
+                self.left.adopt(left, right) + self.right.adopt(left, right)
+            )
+            if self.channel is None:
+                # Bolts that were not on the bar before may have a file
+                for b in missing:
+                    b.refresh()
+
+        if 'screen' in changed:
+            self.get_screen_width()
+            self.watch_screen()
+
+        if 'render' in changed:
+            self.setup_renderer()
+
+        self.renderer.request()
+
+    def start(self):
+        if self.channel is None:
+            self.watch_files()
+        else:
+            self.watch_channel()
+        self.watch_screen()
 
-        # Run the initial grab of data
         self.process_default(None)
 
-        asyncore.loop()
+        while True:
+            # Sleep until there are events, or until a pending render is due
+            for key, mask in self.selector.select(self.renderer.timeout()):
+                key.data()
+
+            self.renderer.poll()
 
 
 def main():
     cloud = Cloud()
     cloud.setup()
+    cloud.watch_config()
     cloud.start()
 
 if __name__ == '__main__':
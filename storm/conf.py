@@ -1,26 +1,60 @@
 import os
-from os.path import join, expanduser
+import json
+import select
+import threading
+from os.path import join, basename, dirname, expanduser
 
-import yaml
 from logbook import Logger
 
+from storm import inotify
+from storm import util
+
 logger = Logger('conf')
 
 xdg = os.getenv('XDG_CACHE_HOME', join(os.getenv('HOME'), '.cache'))
 ROOT = join(xdg, 'storm')
 
+# The merged and validated config as JSON. It lives next to the data directory
+# rather than in it, where the cloud would take it for a bolt.
+SNAPSHOT = join(xdg, 'storm-config.json')
+SNAPSHOT_VERSION = 1
+
+# Sections and keys that storm cannot start without
+REQUIRED = (
+    ('colors', ('fg_1', 'bg_1', 'icon', 'sep')),
+    ('font', ('name', 'width')),
+    ('mail', ('mailroot',)),
+    ('items', ()),
+)
+
+# Sections that are only read on startup, so changes to them need a restart
+RESTART = ('process', 'ipc', 'scheduler', 'hlwm', 'dzen', 'mail', 'volume')
+
+lock = threading.Lock()
+
+
+def global_path():
+    xdg = os.getenv('XDG_CONFIG_DIRS', '/etc/xdg')
+    return join(xdg, 'storm', 'config.yml')
+
+
+def local_path():
+    xdg = os.getenv('XDG_CONFIG_HOME', join(os.getenv('HOME'), '.config'))
+    return join(xdg, 'storm', 'config.yml')
+
 
 def get_global():
+    import yaml
+
     logger.info('Loading global config')
-    xdg = os.getenv('XDG_CONFIG_DIRS', '/etc/xdg')
-    filename = join(xdg, 'storm', 'config.yml')
-    return yaml.load(open(filename))
+    return yaml.load(open(global_path()))
 
 
 def get_local():
+    import yaml
+
     logger.info('Loading local config')
-    xdg = os.getenv('XDG_CONFIG_HOME', join(os.getenv('HOME'), '.config'))
-    local = join(xdg, 'storm', 'config.yml')
+    local = local_path()
 
     try:
         return yaml.load(open(local))
@@ -29,17 +63,228 @@ def get_local():
         return {}
 
 
+def validate(config):
+    """
+    Raise ValueError unless the sections that storm relies on are there
+
+    """
+
+    for section, keys in REQUIRED:
+        if not isinstance(config.get(section), dict):
+            raise ValueError('Config has no "{0}" section'.format(section))
+        for key in keys:
+            if key not in config[section]:
+                raise ValueError(
+                    'Config has no "{0}" in "{1}"'.format(key, section)
+                )
+
+    for side in ('left', 'right'):
+        for item in config['items'].get(side) or ():
+            if not isinstance(item, dict) or 'runner' not in item:
+                raise ValueError(
+                    'Config item without a runner: {0!r}'.format(item)
+                )
+
+
+def fingerprint():
+    """
+    The path, mtime and size of both config files; None for a missing file
+
+    """
+
+    key = []
+    for path in (global_path(), local_path()):
+        try:
+            st = os.stat(path)
+        except OSError:
+            key.append([path, None])
+            continue
+        key.append([path, st.st_mtime_ns, st.st_size])
+    return key
+
+
+def read_snapshot(key):
+    try:
+        with open(SNAPSHOT) as fp:
+            snapshot = json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        return None
+    if snapshot.get('key') != key:
+        return None
+    return snapshot['config']
+
+
+def write_snapshot(key, config):
+    snapshot = {'version': SNAPSHOT_VERSION, 'key': key, 'config': config}
+    try:
+        data = json.dumps(snapshot)
+        os.makedirs(xdg, exist_ok=True)
+        util.atomic_write(SNAPSHOT, data)
+    except (OSError, TypeError, ValueError):
+        # Not the end of the world; the YAML is parsed again next time.
+        logger.exception('Cannot write config snapshot to {0}', SNAPSHOT)
+
+
 def load():
-    g_yaml = get_global()
-    local_yaml = get_local()
+    """
+    The merged config, from the snapshot if neither YAML file has changed
+
+    """
+
+    key = fingerprint()
+    config = read_snapshot(key)
+
+    if config is None:
+        config = get_global()
+
+        # Merge the two by overwriting the data from local
+        config.update(get_local())
 
-    # Merge the two by overwriting the data from local
-    g_yaml.update(local_yaml)
+        validate(config)
+        write_snapshot(key, config)
+    else:
+        logger.info('Loaded config snapshot from {0}', SNAPSHOT)
 
     # These need to be paths rather than tildes
     # TODO: Un-uglify
-    g_yaml['mail']['mailroot'] = expanduser(g_yaml['mail']['mailroot'])
+    config['mail']['mailroot'] = expanduser(config['mail']['mailroot'])
+
+    return config
+
+
+def diff(old, new):
+    """
+    The names of the top level sections that differ between two configs
+
+    """
+
+    return set(
+        section for section in set(old) | set(new)
+        if old.get(section) != new.get(section)
+    )
+
+
+class Reloader(util.LoggedClass):
+    """
+    Swaps in the new config whenever one of the config files changes
+
+    This is a watcher like the ones for `Hooker.event`. Its fd is an inotify
+    watch on the directories of both files, since editors tend to replace a
+    file rather than write to it. `read()` loads the config again if the
+    fingerprint of the files changed, and hands the old and the new config
+    and the names of the changed sections to every subscriber.
+
+    A config that fails to load or validate is logged and ignored, and the
+    running one is kept.
+
+    """
+
+    mask = (
+        inotify.IN_CLOSE_WRITE | inotify.IN_MOVED_TO |
+        inotify.IN_CREATE | inotify.IN_DELETE
+    )
+
+    def __init__(self):
+        import pyinotify as inf
+
+        self.key = fingerprint()
+        self.subscribers = []
+        self.pending = False
+        self.reloads = 0
+
+        self.wm = inf.WatchManager()
+        self.notifier = inf.Notifier(self.wm, self.event, timeout=0)
+        for path in (global_path(), local_path()):
+            if os.path.isdir(dirname(path)):
+                self.wm.add_watch(dirname(path), self.mask)
+
+        super().__init__()
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def event(self, event):
+        if event.mask & inotify.IN_Q_OVERFLOW:
+            self.pending = True
+        elif basename(event.pathname) == 'config.yml':
+            self.pending = True
+
+    def fds(self):
+        return [self.wm.get_fd()]
+
+    def read(self):
+        self.notifier.read_events()
+        self.notifier.process_events()
+
+        if not self.pending:
+            return []
+        self.pending = False
+
+        changed = self.check()
+        return [changed] if changed else []
+
+    def check(self):
+        key = fingerprint()
+        if key == self.key:
+            return set()
+        self.key = key
+
+        try:
+            new = load()
+        except Exception:
+            self.log.exception('Cannot load the new config, keeping this one')
+            return set()
+
+        global CONFIG
+        with lock:
+            old = globals().get('CONFIG')
+            CONFIG = new
+
+        if old is None:
+            return set()
+
+        changed = diff(old, new)
+        if not changed:
+            return changed
+
+        self.reloads += 1
+        self.log.info('Config changed: {0}', ', '.join(sorted(changed)))
+
+        restart = changed.intersection(RESTART)
+        if restart:
+            self.log.warning(
+                'Changes to {0} only apply after a restart',
+                ', '.join(sorted(restart))
+            )
+
+        for callback in self.subscribers:
+            callback(old, new, changed)
+        return changed
+
+    def run(self):
+        """
+        Watch in the current thread
+
+        """
+
+        while True:
+            select.select(self.fds(), [], [])
+            self.read()
+
+
+def __getattr__(name):
+    # CONFIG is loaded on first use rather than on import
+    global CONFIG
 
-    return g_yaml
+    if name != 'CONFIG':
+        raise AttributeError(
+            'module {0!r} has no attribute {1!r}'.format(__name__, name)
+        )
 
-CONFIG = load()
+    with lock:
+        if 'CONFIG' not in globals():
+            CONFIG = load()
+    return CONFIG
@@ -0,0 +1,80 @@
+import os
+from os.path import join
+
+from storm import util
+
+DRM = '/sys/class/drm'
+
+
+class Screens(util.LoggedClass):
+    """
+    The geometry of a monitor, from the connectors under /sys/class/drm
+
+    A connector is e.g. `card0-eDP-1`, with a `status` of "connected" and
+    its `modes` one per line, preferred first. The preferred mode is taken
+    as the geometry. `output` picks a connector by name, like "eDP-1" or
+    "card0-eDP-1"; without one the first connected output is used.
+
+    Pass another `root` to read a fake tree.
+
+    """
+
+    def __init__(self, root=DRM, output=None):
+        self.root = root
+        self.output = output
+        self.scans = 0
+        super().__init__()
+
+    def read(self, connector, attr):
+        try:
+            with open(join(self.root, connector, attr)) as fp:
+                return fp.read()
+        except OSError:
+            return ''
+
+    def names(self):
+        """
+        The names of all connectors, whether anything is connected or not
+
+        """
+
+        return [
+            name for name in sorted(os.listdir(self.root))
+            # Not card0 itself, renderD128 and the like
+            if '-' in name and name.startswith('card')
+        ]
+
+    def connectors(self):
+        """
+        The connected outputs, as {name: (width, height)}
+
+        """
+
+        self.scans += 1
+        outputs = {}
+        for name in self.names():
+            if self.read(name, 'status').strip() != 'connected':
+                continue
+
+            modes = self.read(name, 'modes').split()
+            if not modes:
+                continue
+            width, _, height = modes[0].partition('x')
+            # Interlaced modes come as e.g. "1920x1080i"
+            outputs[name] = (int(width), int(height.rstrip('i')))
+        return outputs
+
+    def geometry(self):
+        """
+        (width, height) of the chosen output, or None if it is not connected
+
+        """
+
+        outputs = self.connectors()
+        if self.output is None:
+            return next(iter(outputs.values()), None)
+
+        for name, geometry in outputs.items():
+            if self.output in (name, name.partition('-')[2]):
+                return geometry
+        return None
@@ -0,0 +1,102 @@
+import time
+import threading
+import subprocess as sub
+
+from storm import util
+
+
+def arguments(settings, font):
+    return [
+        settings.get('command', 'dzen2'),
+        '-dock', '-ta', 'l', '-sa', 'rc',
+        '-fn', font, '-h', str(settings.get('height', 17))
+    ]
+
+
+class Dzen(util.LoggedClass):
+    """
+    A dzen2 process that we own, used as the output file of the Cloud
+
+    Should dzen2 die, it is started again and handed the last line, without
+    the collectors or the cloud noticing anything.
+
+    """
+
+    # Wait this long before restarting a dzen2 that died right after it was
+    # started, rather than respawning it in a tight loop.
+    backoff = 1.0
+
+    def __init__(self, args):
+        self.args = args
+        self.process = None
+        self.started = None
+        self.last = None
+        self.restarts = 0
+        self.lock = threading.Lock()
+
+        super().__init__()
+
+    def start(self):
+        with self.lock:
+            self.spawn()
+
+        t = threading.Thread(None, self.watch)
+        t.daemon = True
+        t.start()
+
+    def spawn(self):
+        self.log.info('Starting {0}', self.args[0])
+        self.started = time.monotonic()
+        self.process = sub.Popen(
+            self.args,
+            bufsize=0,
+            stdin=sub.PIPE,
+            stdout=sub.DEVNULL,
+            stderr=sub.DEVNULL,
+        )
+
+    def restart(self, process):
+        """
+        Replace `process` with a new dzen2, unless that already happened
+
+        """
+
+        with self.lock:
+            if process is not self.process:
+                return
+
+            self.log.warning('dzen2 exited with {0}', process.poll())
+            if time.monotonic() - self.started < self.backoff:
+                time.sleep(self.backoff)
+
+            self.restarts += 1
+            self.spawn()
+            if self.last is not None:
+                self.send(self.last)
+
+    def watch(self):
+        while True:
+            process = self.process
+            process.wait()
+            self.restart(process)
+
+    def send(self, data):
+        try:
+            self.process.stdin.write(data.encode())
+            return True
+        except (BrokenPipeError, ValueError):
+            return False
+
+    def write(self, data):
+        self.last = data
+        with self.lock:
+            process = self.process
+            if self.send(data):
+                return
+
+        # It died under us; the watcher would get to it as well, but this
+        # gets the line out sooner.
+        self.restart(process)
+
+    def flush(self):
+        pass
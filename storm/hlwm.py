@@ -0,0 +1,194 @@
+import os
+import time
+import select
+import signal
+import threading
+import subprocess as sub
+
+from collections import Counter, OrderedDict, defaultdict
+
+from storm import offload
+from storm import util
+
+
+def parse_hook(line):
+    """
+    Split a line from `herbstclient --idle` into its non-empty parts
+
+    line = b"focus_changed\t0x1400003\tmain@rey"
+
+    """
+    parts = line.decode().replace('\n', '').split('\t')
+    return [part for part in parts if len(part) > 0]
+
+
+class Client(util.LoggedClass):
+    """
+    The one herbstclient that runs commands for all of storm
+
+    herbstclient cannot keep a connection open for commands, so every call is
+    still a process of its own. They are however run one at a time, and the
+    listener batches the hooks so that a flood of tag events ends up as one
+    call. A call that takes longer than `timeout` seconds is killed, so that
+    a hung herbstclient does not hold up all the calls after it.
+
+    """
+
+    def __init__(self, command='herbstclient', timeout=2):
+        self.command = command
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.calls = 0
+        super().__init__()
+
+    def call(self, *args):
+        with self.lock:
+            self.calls += 1
+            # A session of its own, so that whatever it started is killed
+            # with it and lets go of the pipe
+            process = sub.Popen(
+                [self.command] + list(args),
+                stdout=sub.PIPE,
+                start_new_session=True
+            )
+            try:
+                out, _ = process.communicate(timeout=self.timeout)
+            except sub.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.communicate()
+                raise offload.Timeout(
+                    '{0} {1} was killed after {2}s'.format(
+                        self.command, ' '.join(args), self.timeout
+                    )
+                )
+            return out.decode()
+
+
+class IdleListener(util.LoggedClass):
+    """
+    One `herbstclient --idle` shared by every hlwm hook
+
+    Each line is parsed once and handed to the subscribers of its hook. Hooks
+    that arrive within `batch` seconds of the first one are collected, and
+    every subscriber is called once per batch with the last hook it matched.
+
+    """
+
+    def __init__(self, command='herbstclient', batch=0.05,
+                 clock=time.monotonic):
+        self.command = command
+        self.batch = batch
+        self.clock = clock
+
+        self.subscribers = defaultdict(list)
+        self.pending = OrderedDict()
+        self.first = None
+        self.buffer = b''
+        self.handle = None
+
+        self.lines = 0
+        self.hooks = Counter()
+        self.batches = 0
+        self.dispatched = 0
+
+        super().__init__()
+
+    def subscribe(self, hooks, callback):
+        for hook in hooks:
+            self.subscribers[hook].append(callback)
+
+    def spawn(self):
+        return sub.Popen([self.command, '--idle'], stdout=sub.PIPE)
+
+    def feed(self, data):
+        self.buffer += data
+        *lines, self.buffer = self.buffer.split(b'\n')
+
+        for line in lines:
+            self.lines += 1
+            hook = parse_hook(line)
+            if not hook:
+                continue
+
+            self.hooks[hook[0]] += 1
+            for callback in self.subscribers.get(hook[0], ()):
+                self.pending[callback] = hook
+
+        if self.pending and self.first is None:
+            self.first = self.clock()
+
+    def timeout(self):
+        """
+        Seconds until the pending batch is due, or None if there is none
+
+        """
+
+        if self.first is None:
+            return None
+        return max(0, self.first + self.batch - self.clock())
+
+    def flush(self):
+        pending, self.pending = self.pending, OrderedDict()
+        self.first = None
+        if not pending:
+            return
+
+        self.batches += 1
+        for callback, hook in pending.items():
+            self.dispatched += 1
+            callback(hook)
+
+    def run(self):
+        """
+        Listen in the current thread until herbstclient exits
+
+        """
+
+        process = self.spawn()
+        fd = process.stdout.fileno()
+
+        while True:
+            ready, _, _ = select.select([fd], [], [], self.timeout())
+            if ready:
+                data = os.read(fd, 65536)
+                if not data:
+                    break
+                self.feed(data)
+
+            if self.timeout() == 0:
+                self.flush()
+
+        self.flush()
+        self.log.warning('herbstclient --idle exited')
+
+    def attach(self, loop):
+        """
+        Listen on an asyncio loop
+
+        """
+
+        process = self.spawn()
+        self.loop = loop
+        self.fd = process.stdout.fileno()
+        os.set_blocking(self.fd, False)
+        loop.add_reader(self.fd, self.readable)
+
+    def readable(self):
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return
+
+        if not data:
+            self.loop.remove_reader(self.fd)
+            self.flush()
+            self.log.warning('herbstclient --idle exited')
+            return
+
+        self.feed(data)
+        if self.first is not None and self.handle is None:
+            self.handle = self.loop.call_later(self.timeout(), self.due)
+
+    def due(self):
+        self.handle = None
+        self.flush()
@@ -0,0 +1,11 @@
+# The inotify event bits from <sys/inotify.h>. They are kernel ABI, so masks
+# can be built from these without importing pyinotify, which is then only
+# loaded once something is actually watched.
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
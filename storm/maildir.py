@@ -0,0 +1,102 @@
+import os
+import glob
+import threading
+from os.path import join, basename
+
+from storm import inotify
+from storm import util
+
+# Only messages arriving in or leaving new/ change the count. IN_Q_OVERFLOW
+# is always delivered and means that we have to scan everything again.
+MASK = (
+    inotify.IN_CREATE | inotify.IN_MOVED_TO |
+    inotify.IN_DELETE | inotify.IN_MOVED_FROM
+)
+
+EXCLUDE = ('/archive/',)
+
+
+def skip(path):
+    """
+    Watch filter that keeps the watches off cur/, tmp/ and excluded folders
+
+    """
+
+    if basename(path) in ('cur', 'tmp'):
+        return True
+    return any(e in path + '/' for e in EXCLUDE)
+
+
+class Index(util.LoggedClass):
+    """
+    The unread messages under a mail root, as a set of names per new/ folder
+
+    The folders are `<root>/*/*/new`, as with e.g. mbsync. They are listed
+    once on startup and on inotify queue overflows; otherwise the sets are
+    kept up to date from the events on the new/ folders.
+
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.folders = {}
+        self.lock = threading.Lock()
+        self.scans = 0
+        self.events = 0
+
+        super().__init__()
+        self.scan()
+
+    def scan(self):
+        folders = {}
+        for path in glob.glob(join(self.root, '*', '*', 'new')):
+            if skip(path):
+                continue
+            folders[path] = set(os.listdir(path))
+
+        with self.lock:
+            self.folders = folders
+            self.scans += 1
+
+    def apply(self, event):
+        """
+        Update the index from an inotify event
+
+        """
+
+        self.events += 1
+        if event.mask & inotify.IN_Q_OVERFLOW:
+            self.log.warning('inotify queue overflow, scanning {0}', self.root)
+            self.scan()
+            return
+
+        if event.dir:
+            # A new/ folder of its own that came or went
+            if event.name == 'new' and not skip(event.pathname):
+                self.folder(event)
+            return
+
+        if basename(event.path) != 'new' or skip(event.path):
+            return
+
+        with self.lock:
+            names = self.folders.setdefault(event.path, set())
+            if event.mask & (inotify.IN_CREATE | inotify.IN_MOVED_TO):
+                names.add(event.name)
+            else:
+                names.discard(event.name)
+
+    def folder(self, event):
+        with self.lock:
+            if event.mask & (inotify.IN_CREATE | inotify.IN_MOVED_TO):
+                try:
+                    names = set(os.listdir(event.pathname))
+                except OSError:
+                    names = set()
+                self.folders[event.pathname] = names
+            else:
+                self.folders.pop(event.pathname, None)
+
+    def count(self):
+        with self.lock:
+            return sum(len(names) for names in self.folders.values())
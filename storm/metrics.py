@@ -0,0 +1,292 @@
+import os
+import sys
+import json
+import time
+import bisect
+import socket
+import tempfile
+import threading
+from os.path import join
+from contextlib import contextmanager
+
+from logbook import Logger
+
+from storm import util
+
+logger = Logger('metrics')
+
+# Upper bounds of the histogram buckets, in seconds; the last bucket is for
+# everything above.
+BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10
+)
+
+
+class Histogram():
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket that the `q` quantile falls in
+
+        """
+
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": list(self.buckets),
+            "counts": list(self.counts),
+        }
+
+
+class Registry():
+    """
+    Counters, histograms and ages, all by name
+
+    Recording is a dict lookup and an increment under one lock, which is
+    cheap enough to do on every run, format and render. Other stats that are
+    kept elsewhere anyway, like the writes of Storm, are not copied; a
+    `provide`d function is called for them when a snapshot is taken.
+
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.touched = {}
+        self.providers = {}
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.observe(name, self.clock() - start)
+
+    def touch(self, name):
+        """
+        Note that `name` is up to date as of now, for its age
+
+        """
+
+        self.touched[name] = self.clock()
+
+    def provide(self, name, function):
+        self.providers[name] = function
+
+    def snapshot(self):
+        now = self.clock()
+        with self.lock:
+            snapshot = {
+                "pid": os.getpid(),
+                "counters": dict(self.counters),
+                "histograms": dict(
+                    (name, h.snapshot())
+                    for name, h in self.histograms.items()
+                ),
+                "ages": dict(
+                    (name, now - when)
+                    for name, when in self.touched.items()
+                ),
+            }
+
+        for name, function in list(self.providers.items()):
+            snapshot[name] = function()
+        return snapshot
+
+
+# The one registry of this process
+registry = Registry()
+
+
+def runtime_dir():
+    return os.getenv('XDG_RUNTIME_DIR', tempfile.gettempdir())
+
+
+def socket_path(role='storm'):
+    """
+    The socket of the process that plays `role`, i.e. storm or cloud
+
+    """
+
+    return join(runtime_dir(), '%s-%d.sock' % (role, os.getuid()))
+
+
+class Server(util.LoggedClass):
+    """
+    Hands a JSON snapshot of the registry to everyone who connects
+
+    """
+
+    def __init__(self, path, registry=registry):
+        self.path = path
+        self.registry = registry
+
+        if os.path.exists(path):
+            if alive(path):
+                raise OSError('Another storm serves {0}'.format(path))
+            os.unlink(path)
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        os.chmod(path, 0o600)
+        self.sock.listen(4)
+
+        super().__init__()
+
+    def fds(self):
+        return [self.sock.fileno()]
+
+    def read(self):
+        conn, _ = self.sock.accept()
+        with conn:
+            try:
+                data = json.dumps(self.registry.snapshot(), default=str)
+                conn.sendall(data.encode())
+            except OSError:
+                self.log.exception('Cannot send the stats')
+        return []
+
+    def run(self):
+        while True:
+            self.read()
+
+
+def serve(role='storm', registry=registry):
+    """
+    Serve the registry from a daemon thread; None if that is not possible
+
+    """
+
+    try:
+        server = Server(socket_path(role), registry)
+    except OSError:
+        logger.exception('Cannot serve the stats')
+        return None
+
+    t = threading.Thread(None, server.run)
+    t.daemon = True
+    t.start()
+    return server
+
+
+def alive(path):
+    try:
+        fetch(path)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def fetch(path, timeout=2):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return json.loads(b''.join(chunks).decode())
+
+
+def report(out=None, roles=('storm', 'cloud')):
+    """
+    Print the stats of every storm process that is running
+
+    """
+
+    out = out or sys.stdout
+    found = False
+    for role in roles:
+        path = socket_path(role)
+        if not os.path.exists(path):
+            continue
+        try:
+            snapshot = fetch(path)
+        except (OSError, ValueError):
+            continue
+
+        found = True
+        write_snapshot(out, role, snapshot)
+
+    if not found:
+        raise SystemExit(
+            'No running storm found in {0}'.format(runtime_dir())
+        )
+
+
+def write_snapshot(out, role, snapshot):
+    out.write('== %s (pid %d)\n' % (role, snapshot['pid']))
+
+    histograms = snapshot['histograms']
+    if histograms:
+        out.write('\n%-28s %8s %10s %10s %10s\n' % (
+            'timing', 'count', 'p50 ms', 'p99 ms', 'max ms'
+        ))
+        for name in sorted(histograms):
+            h = histograms[name]
+            out.write('%-28s %8d %10.2f %10.2f %10.2f\n' % (
+                name, h['count'], h['p50'] * 1e3, h['p99'] * 1e3,
+                h['max'] * 1e3
+            ))
+
+    counters = snapshot['counters']
+    if counters:
+        out.write('\n%-28s %8s\n' % ('counter', 'count'))
+        for name in sorted(counters):
+            out.write('%-28s %8d\n' % (name, counters[name]))
+
+    ages = snapshot['ages']
+    if ages:
+        out.write('\n%-28s %8s\n' % ('bolt', 'age s'))
+        for name in sorted(ages):
+            out.write('%-28s %8.1f\n' % (name, ages[name]))
+
+    known = ('pid', 'counters', 'histograms', 'ages')
+    for name in sorted(set(snapshot) - set(known)):
+        out.write('\n%s: %s\n' % (name, json.dumps(snapshot[name])))
+    out.write('\n')
@@ -0,0 +1,93 @@
+import os
+import select
+
+from storm import util
+
+
+class FakeMixer():
+    """
+    A stand-in for alsaaudio.Mixer, for tests and benchmarks
+
+    Its poll descriptor is the read end of a pipe, and `set()` writes to it
+    the way ALSA signals a change of a mixer element.
+
+    """
+
+    def __init__(self, volume=50, muted=False):
+        self.volume = volume
+        self.muted = muted
+        self.r, self.w = os.pipe()
+        os.set_blocking(self.r, False)
+
+    def set(self, volume=None, muted=None):
+        if volume is not None:
+            self.volume = volume
+        if muted is not None:
+            self.muted = muted
+        os.write(self.w, b'\0')
+
+    def polldescriptors(self):
+        return [(self.r, select.POLLIN)]
+
+    def handleevents(self):
+        try:
+            return len(os.read(self.r, 4096))
+        except BlockingIOError:
+            return 0
+
+    def getvolume(self):
+        return [self.volume]
+
+    def getmute(self):
+        return [int(self.muted)]
+
+
+class Mixers(util.LoggedClass):
+    """
+    The volume of one mixer control and the mute switch of the default one
+
+    This is a watcher for `Hooker.event`: the fds are the poll descriptors
+    of the mixers, and `read()` has ALSA handle the pending events, which
+    refreshes the values that `sample()` then reads. Nothing is polled in
+    between changes.
+
+    """
+
+    def __init__(self, control='PCM', mixer=None, master=None):
+        if mixer is None or master is None:
+            # Not needed at all unless the volume bolt is configured
+            import alsaaudio
+
+            try:
+                mixer = mixer or alsaaudio.Mixer(control)
+                master = master or alsaaudio.Mixer()
+            except alsaaudio.ALSAAudioError as e:
+                raise OSError('Cannot open mixer {0}: {1}'.format(control, e))
+
+        self.mixer = mixer
+        self.master = master
+
+        self.events = 0
+        super().__init__()
+
+    def fds(self):
+        fds = []
+        for mixer in (self.mixer, self.master):
+            for fd, _ in mixer.polldescriptors():
+                if fd not in fds:
+                    fds.append(fd)
+        return fds
+
+    def read(self):
+        events = [
+            n for n in (self.mixer.handleevents(), self.master.handleevents())
+            if n
+        ]
+        self.events += len(events)
+        return events
+
+    def sample(self):
+        return {
+            "volume": self.mixer.getvolume()[0],
+            "muted": bool(self.master.getmute()[0])
+        }
@@ -0,0 +1,304 @@
+import os
+import time
+import socket
+import struct
+import threading
+from os.path import join
+
+from storm import util
+
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+
+IFLA_IFNAME = 3
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+
+IFF_UP = 0x1
+IFF_LOOPBACK = 0x8
+IFF_LOWER_UP = 0x10000
+
+# struct nlmsghdr, ifinfomsg, ifaddrmsg and rtattr
+NLMSGHDR = struct.Struct('=LHHLL')
+IFINFOMSG = struct.Struct('=BxHiII')
+IFADDRMSG = struct.Struct('=BBBBi')
+RTATTR = struct.Struct('=HH')
+
+
+def align(length):
+    return (length + 3) & ~3
+
+
+def attributes(data):
+    """
+    The rtattrs of a message body as a dict of type -> payload
+
+    """
+
+    attrs = {}
+    offset = 0
+    while offset + RTATTR.size <= len(data):
+        length, kind = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+        attrs[kind] = data[offset + RTATTR.size:offset + length]
+        offset += align(length)
+    return attrs
+
+
+def messages(data):
+    """
+    Split a datagram into (type, body) pairs
+
+    """
+
+    offset = 0
+    while offset + NLMSGHDR.size <= len(data):
+        length, kind, _, _, _ = NLMSGHDR.unpack_from(data, offset)
+        if length < NLMSGHDR.size:
+            break
+        yield kind, data[offset + NLMSGHDR.size:offset + length]
+        offset += align(length)
+
+
+def pack(kind, body, flags=0, seq=0):
+    return NLMSGHDR.pack(NLMSGHDR.size + len(body), kind, flags, seq, 0) + body
+
+
+def pack_attribute(kind, payload):
+    data = RTATTR.pack(RTATTR.size + len(payload), kind) + payload
+    return data + b'\0' * (align(len(data)) - len(data))
+
+
+def pack_link(index, name, up=True, kind=RTM_NEWLINK):
+    """
+    A link message, the way the kernel would send it; for fake feeds
+
+    """
+
+    flags = IFF_UP | IFF_LOWER_UP if up else 0
+    body = IFINFOMSG.pack(socket.AF_UNSPEC, 1, index, flags, 0)
+    body += pack_attribute(IFLA_IFNAME, name.encode() + b'\0')
+    return pack(kind, body)
+
+
+def pack_address(index, address, prefix=24, kind=RTM_NEWADDR):
+    """
+    An IPv4 address message, the way the kernel would send it; for fake feeds
+
+    """
+
+    body = IFADDRMSG.pack(socket.AF_INET, prefix, 0, 0, index)
+    body += pack_attribute(IFA_LOCAL, socket.inet_aton(address))
+    return pack(kind, body)
+
+
+class Addresses(util.LoggedClass):
+    """
+    The links and IPv4 addresses of the machine, kept up to date by rtnetlink
+
+    This is a watcher for `Hooker.event`. The state is dumped once on
+    startup, after which the link and address events come in on a socket
+    of their own, and `read()` applies them. Tests can hand in one end of a
+    socketpair and feed it the messages from `pack_link()` and
+    `pack_address()`, with `dump=False`.
+
+    """
+
+    def __init__(self, sock=None, dump=True):
+        if sock is None:
+            sock = socket.socket(
+                socket.AF_NETLINK,
+                socket.SOCK_RAW,
+                socket.NETLINK_ROUTE
+            )
+            sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR))
+
+        sock.setblocking(False)
+        self.sock = sock
+
+        # index -> (name, up, loopback) and index -> [addresses]
+        self.links = {}
+        self.addresses = {}
+        self.lock = threading.Lock()
+        self.events = 0
+
+        super().__init__()
+
+        # Subscribed before the dump, so no change can fall in between
+        if dump:
+            self.dump()
+
+    def dump(self):
+        sock = socket.socket(
+            socket.AF_NETLINK,
+            socket.SOCK_RAW,
+            socket.NETLINK_ROUTE
+        )
+        with sock:
+            requests = (
+                (RTM_GETLINK, IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)),
+                (RTM_GETADDR, IFADDRMSG.pack(socket.AF_INET, 0, 0, 0, 0)),
+            )
+            for seq, (kind, body) in enumerate(requests, 1):
+                sock.send(pack(kind, body, NLM_F_REQUEST | NLM_F_DUMP, seq))
+                done = False
+                while not done:
+                    for reply, body in messages(sock.recv(65536)):
+                        if reply in (NLMSG_DONE, NLMSG_ERROR):
+                            done = True
+                            break
+                        self.apply(reply, body)
+
+    def apply(self, kind, body):
+        with self.lock:
+            if kind in (RTM_NEWLINK, RTM_DELLINK):
+                _, _, index, flags, _ = IFINFOMSG.unpack_from(body)
+                attrs = attributes(body[IFINFOMSG.size:])
+                if kind == RTM_DELLINK:
+                    self.links.pop(index, None)
+                    self.addresses.pop(index, None)
+                    return True
+
+                name = attrs.get(IFLA_IFNAME, b'').rstrip(b'\0').decode()
+                up = flags & (IFF_UP | IFF_LOWER_UP) == IFF_UP | IFF_LOWER_UP
+                loopback = bool(flags & IFF_LOOPBACK)
+                self.links[index] = (name, up, loopback)
+                return True
+
+            if kind in (RTM_NEWADDR, RTM_DELADDR):
+                family, _, _, _, index = IFADDRMSG.unpack_from(body)
+                if family != socket.AF_INET:
+                    return False
+
+                attrs = attributes(body[IFADDRMSG.size:])
+                raw = attrs.get(IFA_LOCAL, attrs.get(IFA_ADDRESS))
+                if raw is None:
+                    return False
+
+                address = socket.inet_ntoa(raw)
+                addresses = self.addresses.setdefault(index, [])
+                if kind == RTM_NEWADDR and address not in addresses:
+                    addresses.append(address)
+                elif kind == RTM_DELADDR and address in addresses:
+                    addresses.remove(address)
+                return True
+
+        return False
+
+    def fds(self):
+        return [self.sock.fileno()]
+
+    def read(self):
+        events = []
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                break
+
+            for kind, body in messages(data):
+                if self.apply(kind, body):
+                    events.append(kind)
+
+        self.events += len(events)
+        return events
+
+    def current(self):
+        """
+        The first address of the first link that is up, and its name
+
+        Loopback links are passed over, so this is ("N/A", None) when there
+        is nothing but those.
+
+        """
+
+        with self.lock:
+            for index in sorted(self.links):
+                name, up, loopback = self.links[index]
+                addresses = self.addresses.get(index)
+                if up and not loopback and addresses:
+                    return addresses[0], name
+        return "N/A", None
+
+
+class Throughput(util.LoggedClass):
+    """
+    Bytes per second up and down, per interface, from /proc/net/dev
+
+    Rates are over the time since the previous sample. A sample that comes
+    sooner than `min_age` seconds after it hands out the previous rates,
+    rather than a rate over a window too short to mean anything. Pass
+    another `root` to read a fake tree.
+
+    """
+
+    def __init__(self, root='/proc', min_age=1.0, clock=time.monotonic):
+        self.fd = os.open(join(root, 'net', 'dev'), os.O_RDONLY)
+        self.min_age = min_age
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        self.counters = None
+        self.taken = None
+        self.rates = {}
+
+        super().__init__()
+
+    def read(self):
+        chunks = []
+        while True:
+            chunk = os.pread(self.fd, 65536, sum(len(c) for c in chunks))
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+        # The two header lines, then e.g.
+        # "  eth0: 1234 10 0 0 0 0 0 0 5678 12 0 0 0 0 0 0"
+        counters = {}
+        for line in b''.join(chunks).decode().splitlines()[2:]:
+            name, _, fields = line.partition(':')
+            fields = fields.split()
+            counters[name.strip()] = (int(fields[8]), int(fields[0]))
+        return counters
+
+    def sample(self):
+        """
+        {"eth0": {"up": 1024.0, "down": 81920.0}, ...}
+
+        """
+
+        with self.lock:
+            now = self.clock()
+            if self.taken is not None and now - self.taken < self.min_age:
+                return self.rates
+
+            counters = self.read()
+            if self.counters is not None:
+                elapsed = now - self.taken
+                rates = {}
+                for name, (sent, received) in counters.items():
+                    last = self.counters.get(name)
+                    if last is None:
+                        continue
+                    # Counters start over when a driver is reloaded
+                    rates[name] = {
+                        "up": max(sent - last[0], 0) / elapsed,
+                        "down": max(received - last[1], 0) / elapsed,
+                    }
+                self.rates = rates
+
+            self.counters, self.taken = counters, now
+            return self.rates
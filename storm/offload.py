@@ -0,0 +1,22 @@
+# How a source is run: in the thread that triggers it, or on the worker pool.
+INLINE = 'inline'
+THREAD = 'thread'
+CLASSES = (INLINE, THREAD)
+
+DEFAULT = {'how': THREAD, 'deadline': None}
+
+
+class Timeout(Exception):
+    """
+    A source gave up on something that hung, e.g. a command that it killed
+
+    """
+
+
+def execution(method):
+    """
+    The execution class and deadline of a source, see `Hooker.execute`
+
+    """
+
+    return getattr(method, 'execution', DEFAULT)
@@ -0,0 +1,319 @@
+import os
+import signal
+import tarfile
+import threading
+import subprocess as sub
+from os.path import join
+
+from storm import util
+
+DIGITS = set('0123456789')
+ALPHA = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ')
+ALNUM = DIGITS | ALPHA
+
+
+def rpmvercmp(a, b):
+    """
+    Compare two version strings like libalpm does; returns -1, 0 or 1
+
+    """
+
+    if a == b:
+        return 0
+
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start_i, start_j = i, j
+        while i < len(a) and a[i] not in ALNUM:
+            i += 1
+        while j < len(b) and b[j] not in ALNUM:
+            j += 1
+
+        if i >= len(a) or j >= len(b):
+            break
+
+        # Different lengths of separators decide it
+        if i - start_i != j - start_j:
+            return -1 if i - start_i < j - start_j else 1
+
+        kind = DIGITS if a[i] in DIGITS else ALPHA
+        end_i, end_j = i, j
+        while end_i < len(a) and a[end_i] in kind:
+            end_i += 1
+        while end_j < len(b) and b[end_j] in kind:
+            end_j += 1
+
+        one, two = a[i:end_i], b[j:end_j]
+        if not two:
+            # Numeric segments are always newer than alpha ones
+            return 1 if kind is DIGITS else -1
+
+        if kind is DIGITS:
+            one, two = one.lstrip('0'), two.lstrip('0')
+            if len(one) != len(two):
+                return 1 if len(one) > len(two) else -1
+
+        if one != two:
+            return 1 if one > two else -1
+
+        i, j = end_i, end_j
+
+    rest_a, rest_b = a[i:], b[j:]
+    if not rest_a and not rest_b:
+        return 0
+
+    # A remaining alpha segment never beats an empty string
+    if (not rest_a and rest_b[0] not in ALPHA) or \
+            (rest_a and rest_a[0] in ALPHA):
+        return -1
+    return 1
+
+
+def split_evr(evr):
+    """
+    "1:2.3-4" -> ("1", "2.3", "4"); the epoch defaults to "0" and the
+    release to None
+
+    """
+
+    epoch, sep, rest = evr.partition(':')
+    if not sep or not epoch.isdigit():
+        epoch, rest = '0', evr
+
+    version, sep, release = rest.rpartition('-')
+    if not sep:
+        return epoch, rest, None
+    return epoch, version, release
+
+
+def vercmp(a, b):
+    """
+    Compare two full package versions, as `vercmp` does
+
+    """
+
+    if a == b:
+        return 0
+
+    epoch_a, version_a, release_a = split_evr(a)
+    epoch_b, version_b, release_b = split_evr(b)
+
+    ret = rpmvercmp(epoch_a, epoch_b)
+    if ret == 0:
+        ret = rpmvercmp(version_a, version_b)
+        if ret == 0 and release_a and release_b:
+            ret = rpmvercmp(release_a, release_b)
+    return ret
+
+
+def parse_desc(text):
+    """
+    The %NAME% and %VERSION% of a package `desc` file
+
+    """
+
+    fields = {}
+    lines = iter(text.splitlines())
+    for line in lines:
+        if line in ('%NAME%', '%VERSION%'):
+            fields[line.strip('%').lower()] = next(lines, '').strip()
+    return fields.get('name'), fields.get('version')
+
+
+class Packages(util.LoggedClass):
+    """
+    Installed and upgradable package counts, read straight from the databases
+
+    The local database is `<dbpath>/local/<pkg>/desc`, and the sync databases
+    are the `<syncpath>/*.db` tarballs that the background refresh keeps up
+    to date. Parsed versions are cached, and only parsed again when the
+    mtime of the local directory or of a sync database changes.
+
+    """
+
+    def __init__(self, dbpath='/var/lib/pacman', syncpath=None):
+        self.local_path = join(dbpath, 'local')
+        self.sync_path = syncpath or join(dbpath, 'sync')
+
+        self.local = {}
+        self.local_key = None
+        self.sync = {}
+        self.sync_keys = {}
+        self.parses = 0
+        self.result = None
+        self.result_key = None
+
+        self.lock = threading.Lock()
+        super().__init__()
+
+    def read_local(self):
+        key = os.stat(self.local_path).st_mtime_ns
+        if key == self.local_key:
+            return self.local
+
+        packages = {}
+        for entry in os.listdir(self.local_path):
+            try:
+                with open(join(self.local_path, entry, 'desc')) as fp:
+                    name, version = parse_desc(fp.read())
+            except OSError:
+                # ALPM_DB_VERSION and the like
+                continue
+            if name:
+                packages[name] = version
+
+        self.parses += 1
+        self.local, self.local_key = packages, key
+        return packages
+
+    def read_sync_db(self, path):
+        packages = {}
+        with tarfile.open(path, 'r:*') as tar:
+            for member in tar:
+                if not member.name.endswith('/desc'):
+                    continue
+                name, version = parse_desc(
+                    tar.extractfile(member).read().decode()
+                )
+                if name:
+                    packages[name] = version
+
+        self.parses += 1
+        return packages
+
+    def read_sync(self):
+        try:
+            names = sorted(n for n in os.listdir(self.sync_path)
+                           if n.endswith('.db'))
+        except FileNotFoundError:
+            names = []
+
+        keys = {}
+        for name in names:
+            st = os.stat(join(self.sync_path, name))
+            keys[name] = (st.st_mtime_ns, st.st_size)
+
+        if keys != self.sync_keys:
+            dbs = {}
+            for name in names:
+                if self.sync_keys.get(name) == keys[name]:
+                    dbs[name] = self.sync[name]
+                else:
+                    dbs[name] = self.read_sync_db(join(self.sync_path, name))
+            self.sync, self.sync_keys = dbs, keys
+
+        return [self.sync[name] for name in names]
+
+    def counts(self):
+        with self.lock:
+            local = self.read_local()
+            repos = self.read_sync()
+            key = (self.local_key, self.sync_keys)
+            if key == self.result_key:
+                return self.result
+
+        new = 0
+        for name, version in local.items():
+            # Like pacman, the first repository that has it wins
+            for repo in repos:
+                if name in repo:
+                    if vercmp(repo[name], version) > 0:
+                        new += 1
+                    break
+
+        result = {
+            "installed": len(local),
+            "new": new
+        }
+        with self.lock:
+            self.result, self.result_key = result, key
+        return result
+
+
+class Refresh(util.LoggedClass):
+    """
+    `pacman -Sy` into a separate database, as a background job
+
+    Only one runs at a time. It is killed if it takes more than `timeout`
+    seconds or when it is cancelled, and `done` is called when it succeeds.
+    Failures, including those of `done`, are logged and counted.
+
+    """
+
+    def __init__(self, fakedb, timeout=120):
+        self.fakedb = fakedb
+        self.timeout = timeout
+        self.process = None
+        self.thread = None
+        self.cancelled = False
+        self.timeouts = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+        super().__init__()
+
+    def start(self, done=None):
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return False
+
+            self.cancelled = False
+            self.thread = threading.Thread(None, self.run, args=(done,))
+            self.thread.daemon = True
+            self.thread.start()
+            return True
+
+    def run(self, done):
+        # Nobody waits for this thread, so whatever goes wrong is logged here
+        try:
+            self.refresh(done)
+        except Exception:
+            self.failures += 1
+            self.log.exception('Cannot refresh the package databases')
+
+    def refresh(self, done):
+        os.makedirs(join(self.fakedb, "sync"), exist_ok=True)
+
+        # A refresh that was killed leaves its lock behind
+        fakelock = join(self.fakedb, "db.lck")
+        if os.path.exists(fakelock):
+            os.remove(fakelock)
+
+        self.process = sub.Popen(
+            ['fakeroot', 'pacman', '--dbpath', self.fakedb, '-Sy'],
+            stdout=sub.DEVNULL,
+            stderr=sub.DEVNULL,
+            start_new_session=True,
+        )
+
+        try:
+            returncode = self.process.wait(self.timeout)
+        except sub.TimeoutExpired:
+            self.timeouts += 1
+            self.log.warning('pacman -Sy timed out after {0}s', self.timeout)
+            self.kill()
+            return
+        finally:
+            self.process = None
+
+        if self.cancelled:
+            return
+        if returncode != 0:
+            self.failures += 1
+            self.log.warning('pacman -Sy exited with {0}', returncode)
+            return
+        if done is not None:
+            done()
+
+    def kill(self):
+        process = self.process
+        if process is None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+
+    def cancel(self):
+        self.cancelled = True
+        self.kill()
@@ -0,0 +1,180 @@
+import os
+import sys
+import time
+import threading
+from os.path import join
+from collections import Counter
+
+from storm import conf
+from storm import util
+
+
+def label(code):
+    """
+    A function as `package/module.py:line(name)`, pstats style
+
+    """
+
+    path = '/'.join(code.co_filename.split(os.sep)[-2:])
+    return '%s:%d(%s)' % (path, code.co_firstlineno, code.co_name)
+
+
+def paths(role):
+    """
+    The report and the collapsed stacks of `role`, in the cache dir
+
+    They go next to the data directory rather than in it, where the cloud
+    would take them for bolts.
+
+    """
+
+    base = join(conf.xdg, '%s-profile' % role)
+    return base + '.txt', base + '.folded'
+
+
+class Profiler(util.LoggedClass):
+    """
+    A statistical CPU profiler for all threads of the process
+
+    cProfile only sees the thread that enabled it, so instead the stacks of
+    all threads are sampled every `interval` seconds. Each stack is charged
+    with the CPU time that its thread used since the previous sample, as per
+    the CPU clock of the thread, so threads that sleep in select() and the
+    like cost nothing. Only the Python side of subprocesses is seen.
+
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+
+        # (thread, frame, ...) -> CPU seconds
+        self.stacks = Counter()
+        self.clocks = {}
+        self.samples = 0
+        self.done = threading.Event()
+        super().__init__()
+
+    def cpu(self, ident):
+        try:
+            return time.clock_gettime(time.pthread_getcpuclockid(ident))
+        except OSError:
+            # The thread has exited meanwhile
+            return None
+
+    def sample(self):
+        names = dict((t.ident, t.name) for t in threading.enumerate())
+        me = threading.get_ident()
+
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+
+            cpu = self.cpu(ident)
+            last = self.clocks.get(ident)
+            self.clocks[ident] = cpu
+            if cpu is None or last is None or cpu <= last:
+                continue
+
+            stack = []
+            while frame is not None:
+                stack.append(label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)).replace(' ', '_'))
+            stack.reverse()
+            self.stacks[tuple(stack)] += cpu - last
+
+        self.samples += 1
+
+    def run(self, seconds):
+        end = time.monotonic() + seconds
+        while time.monotonic() < end and not self.done.wait(self.interval):
+            self.sample()
+
+    def functions(self):
+        """
+        {function: (own, total)} in CPU seconds, over all threads
+
+        """
+
+        own = Counter()
+        total = Counter()
+        for stack, seconds in self.stacks.items():
+            frames = stack[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += seconds
+            for frame in set(frames):
+                total[frame] += seconds
+        return dict((f, (own[f], total[f])) for f in total)
+
+    def threads(self):
+        threads = Counter()
+        for stack, seconds in self.stacks.items():
+            threads[stack[0]] += seconds
+        return threads
+
+    def write_report(self, out, limit=60):
+        functions = self.functions()
+        cpu = sum(self.stacks.values())
+
+        out.write('%d samples, %.3fs of CPU\n\n' % (self.samples, cpu))
+        out.write('%-40s %10s\n' % ('thread', 'cpu ms'))
+        for name, seconds in self.threads().most_common():
+            out.write('%-40s %10.2f\n' % (name, seconds * 1e3))
+
+        out.write('\n%10s %10s %7s  %s\n' % (
+            'own ms', 'total ms', 'total%', 'function'
+        ))
+        ranked = sorted(functions.items(), key=lambda f: -f[1][1])
+        for name, (own, total) in ranked[:limit]:
+            out.write('%10.2f %10.2f %6.1f%%  %s\n' % (
+                own * 1e3, total * 1e3, 100 * total / cpu if cpu else 0, name
+            ))
+
+    def write_collapsed(self, out):
+        """
+        One `thread;outer;...;inner microseconds` line per stack
+
+        That is the input of flamegraph.pl and most flame graph viewers.
+
+        """
+
+        for stack, seconds in sorted(self.stacks.items()):
+            micros = int(seconds * 1e6)
+            if micros:
+                out.write('%s %d\n' % (';'.join(stack), micros))
+
+    def save(self, role):
+        report, collapsed = paths(role)
+        os.makedirs(conf.xdg, exist_ok=True)
+        with open(report, 'w') as fp:
+            self.write_report(fp)
+        with open(collapsed, 'w') as fp:
+            self.write_collapsed(fp)
+        return report, collapsed
+
+
+def start(seconds, role='storm'):
+    """
+    Sample the process for `seconds` from a thread of its own, then exit
+
+    Storm has non-daemon threads that never finish, so the process is ended
+    the hard way once the reports are written.
+
+    """
+
+    profiler = Profiler()
+
+    def run():
+        profiler.run(seconds)
+        report, collapsed = profiler.save(role)
+
+        # Not stdout, which is the pipe into dzen2 for the cloud
+        sys.stderr.write('Wrote %s and %s\n' % (report, collapsed))
+        sys.stderr.flush()
+        os._exit(0)
+
+    t = threading.Thread(None, run, name='profiler')
+    t.daemon = True
+    t.start()
+    return profiler
@@ -0,0 +1,94 @@
+import time
+
+from storm import util
+
+
+class Renderer(util.LoggedClass):
+    """
+    Coalesces render requests into a capped rate of emitted lines
+
+    A request only marks the line as dirty. The line is built once the
+    `debounce` window after the first pending request has passed, and no
+    sooner than 1/`fps` seconds after the previous render, so a burst of
+    requests collapses into one line. A line identical to the previous one is
+    never emitted.
+
+    The owner drives it by waiting at most `timeout()` seconds for something
+    to happen, and then calling `poll()`.
+
+    """
+
+    def __init__(self, build, emit, fps=10, debounce=0.02,
+                 clock=time.monotonic):
+        self.build = build
+        self.emit = emit
+        self.interval = 1.0 / fps if fps else 0
+        self.debounce = debounce
+        self.clock = clock
+
+        self.pending = None
+        self.last_render = float('-inf')
+        self.last_line = None
+
+        self.requests = 0
+        self.renders = 0
+        self.emitted = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+
+        super().__init__()
+
+    def request(self):
+        self.requests += 1
+        if self.pending is None:
+            self.pending = self.clock()
+
+    def due(self):
+        if self.pending is None:
+            return None
+        return max(
+            self.pending + self.debounce,
+            self.last_render + self.interval
+        )
+
+    def timeout(self):
+        """
+        Seconds until the next render is due, or None if nothing is pending
+
+        """
+
+        due = self.due()
+        if due is None:
+            return None
+        return max(0, due - self.clock())
+
+    def poll(self):
+        due = self.due()
+        if due is not None and self.clock() >= due:
+            self.render()
+
+    def render(self):
+        now = self.clock()
+        latency = now - self.pending
+        self.pending = None
+        self.last_render = now
+        self.renders += 1
+
+        line = self.build()
+        if line == self.last_line:
+            return
+
+        self.last_line = line
+        self.emit(line)
+        self.emitted += 1
+        self.latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "renders": self.renders,
+            "emitted": self.emitted,
+            "mean_latency": self.latency / self.emitted if self.emitted else 0,
+            "max_latency": self.max_latency,
+        }
@@ -0,0 +1,535 @@
+import time
+import asyncio
+import selectors
+import functools
+import threading
+
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from storm import util
+from storm import hlwm
+from storm import metrics
+from storm import offload
+from storm import timer
+from storm import trace
+
+
+def configured(config):
+    """
+    The names of the sources that the bolts in `items` are made from
+
+    Without an `items` section at all this is None, for every source.
+
+    """
+
+    if 'items' not in config:
+        return None
+
+    items = config['items']
+    return set(
+        item['runner']
+        for side in ('left', 'right')
+        for item in items.get(side) or ()
+    )
+
+
+class Scheduler(util.LoggedClass):
+    """
+    Drives the sources that Hooker has marked on a Storm object
+
+    Interval sources are all put on one timer wheel, and each run is handed
+    to a bounded pool of workers, unless the source is to run inline. The
+    hlwm sources all subscribe to one idle listener. Subclasses implement one
+    `run_<kind>` method per other kind of source.
+
+    Calls that run past the deadline of their source are counted as
+    timeouts, and their bolts marked as stale. Ticks that are skipped since
+    the last run is still going are counted as overruns.
+
+    """
+
+    def __init__(self, storm, workers=4, report=60, listener=None,
+                 names=None):
+        self.storm = storm
+        self.names = names
+        self.workers = workers
+        self.running = set()
+
+        # Calls with a deadline that are still going, as
+        # {id: [name, deadline, timed out]}
+        self.inflight = {}
+        self.timeouts = Counter()
+        self.overruns = Counter()
+        self.lock = threading.Lock()
+        self.watchdog = None
+
+        # (name, kind) of the sources that were started, and the timers of
+        # the interval ones
+        self.started = set()
+        self.timers = {}
+        self.listening = False
+        self.listener = listener or hlwm.IdleListener()
+
+        # Sources whose inotify watches are in place, and those whose static
+        # run waits for that
+        self.watching = set()
+        self.deferred = set()
+
+        self.wheel = timer.TimerWheel()
+        if report:
+            self.wheel.add(report, self.report)
+
+        super().__init__()
+
+    def sources(self):
+        """
+        Yield (name, method, kind, sources) for every decorated method
+
+        Stacked decorators of the same kind are merged, so that a method that
+        is hooked on two hlwm hooks still only gets one listener. If `names`
+        is set, only the methods named in it are sources; the others are
+        never run and their watchers never created.
+
+        """
+
+        for name in dir(self.storm):
+            if self.names is not None and name not in self.names:
+                continue
+
+            # Look on the class so that we do not trigger properties.
+            if not hasattr(getattr(type(self.storm), name, None), 'runner'):
+                continue
+
+            method = getattr(self.storm, name)
+            kinds = OrderedDict()
+            for source in method.sources:
+                kinds.setdefault(source['kind'], []).append(source)
+
+            for kind, sources in kinds.items():
+                yield name, method, kind, sources
+
+    def collect(self, name, method, *args, output=True):
+        if self.names is not None and name not in self.names:
+            # Taken out of the config; the threads of event sources cannot
+            # be stopped, but their results are not wanted anymore.
+            return
+
+        trace.record('source', name=name, args=args)
+
+        deadline = offload.execution(method)['deadline']
+
+        call = [name, None, False]
+        if deadline is not None:
+            call[1] = time.monotonic() + deadline
+            with self.lock:
+                self.inflight[id(call)] = call
+
+        start = time.monotonic()
+        try:
+            ret = method(*args)
+        except offload.Timeout:
+            # Unless the watchdog got to it first
+            if not call[2]:
+                self.timed_out(name)
+            return
+        except Exception:
+            self.log.exception('Source {0} failed', name)
+            return
+        finally:
+            with self.lock:
+                self.inflight.pop(id(call), None)
+            metrics.registry.observe(
+                'run.%s' % name, time.monotonic() - start
+            )
+
+        if call[1] is not None and not call[2] and time.monotonic() > call[1]:
+            # Late, e.g. inline in a busy thread, but there is a value now
+            self.timed_out(name, stale=False)
+
+        # Pooled runs end up in a future that nobody reads, so this would
+        # fail silently.
+        try:
+            self.storm.write(name, ret, output)
+        except Exception:
+            self.log.exception('Cannot write {0}', name)
+
+    def dispatch(self, name, method, *args, output=True):
+        """
+        Run a call in the execution class of its source; returns a future
+
+        """
+
+        if offload.execution(method)['how'] != offload.INLINE:
+            return self.submit(name, method, *args, output=output)
+
+        future = Future()
+        self.collect(name, method, *args, output=output)
+        future.set_result(None)
+        return future
+
+    def watch(self, method):
+        """
+        Start the watchdog once a source has a deadline to watch
+
+        """
+
+        if offload.execution(method)['deadline'] is None:
+            return
+        if self.watchdog is None:
+            self.watchdog = self.wheel.add(1, self.check_deadlines)
+
+    def check_deadlines(self):
+        now = time.monotonic()
+        with self.lock:
+            late = [
+                call for call in self.inflight.values()
+                if not call[2] and call[1] <= now
+            ]
+            for call in late:
+                call[2] = True
+
+        for name, _, _ in late:
+            self.timed_out(name)
+
+    def timed_out(self, name, stale=True):
+        with self.lock:
+            self.timeouts[name] += 1
+
+        self.log.warning('{0} ran past its deadline', name)
+        if stale and hasattr(self.storm, 'stale'):
+            self.storm.stale(name)
+
+    def stats(self):
+        """
+        Calls past their deadline and skipped ticks, per source
+
+        """
+
+        with self.lock:
+            return {
+                "timeouts": dict(self.timeouts),
+                "overruns": dict(self.overruns),
+            }
+
+    def report(self):
+        self.wheel.report()
+
+        if hasattr(self.storm, 'stats'):
+            stats = self.storm.stats()
+            self.log.info(
+                '{0} writes performed, {1} skipped as unchanged',
+                sum(stats['written'].values()),
+                sum(stats['skipped'].values())
+            )
+
+        stats = self.stats()
+        if stats['timeouts'] or stats['overruns']:
+            self.log.warning(
+                'Timeouts: {0}; overruns: {1}',
+                stats['timeouts'], stats['overruns']
+            )
+
+    def configure(self, names, restart=()):
+        """
+        Switch to another set of configured sources, e.g. on a config reload
+
+        Sources that stay configured are left alone and keep their last
+        values, unless they are in `restart`. The new ones are started, and
+        the ones that are gone are no longer collected.
+
+        """
+
+        self.names = names
+        for name, kind in list(self.started):
+            if name in restart or (names is not None and name not in names):
+                if kind == 'interval':
+                    self.wheel.remove(self.timers.pop(name))
+                if kind in ('interval', 'static'):
+                    # Run again right away once configured again
+                    self.started.discard((name, kind))
+
+        for name, method, kind, sources in self.sources():
+            if (name, kind) not in self.started:
+                self.log.info('Starting {0} source {1}', kind, name)
+                self.start_source(name, method, kind, sources)
+
+    def add_interval(self, name, method, sources):
+        sleep = min(s['sleep'] for s in sources)
+        self.timers[name] = self.wheel.add(
+            sleep,
+            functools.partial(self.due, name, method, output=sleep > 5)
+        )
+
+    def add_hlwm(self, name, method, sources, call):
+        hooks = set(s['hook'] for s in sources)
+        self.listener.subscribe(
+            hooks, lambda hook: call(name, method, hook)
+        )
+
+    def add_watches(self, wm, sources):
+        for source in sources:
+            path = source['path']
+            if callable(path):
+                path = path()
+
+            wm.add_watch(
+                path, source['mask'],
+                rec=True, auto_add=True,
+                exclude_filter=source.get('exclude')
+            )
+
+    def defer_static(self, name, method):
+        """
+        Hold back the static run of a source until its watches are added
+
+        A static run that builds what the inotify events then keep up to
+        date, like the mail index, has to come after the watches, or what
+        changes in between is never seen. Returns True if the run is left to
+        `watches_added`.
+
+        """
+
+        if not any(s['kind'] == 'inotify' for s in method.sources):
+            return False
+
+        with self.lock:
+            if name in self.watching:
+                return False
+            self.deferred.add(name)
+            return True
+
+    def watches_added(self, name, method):
+        with self.lock:
+            self.watching.add(name)
+            deferred = name in self.deferred
+            self.deferred.discard(name)
+
+        if deferred:
+            self.run_static(name, method, ())
+
+    def watchers(self, sources):
+        for source in sources:
+            try:
+                yield getattr(self.storm, source['watcher'])
+            except (OSError, ImportError):
+                self.log.exception('Cannot watch {0}', source['watcher'])
+
+    def due(self, name, method, output=True):
+        """
+        Timer callback; run the source unless its last run is still going
+
+        """
+
+        if name in self.running:
+            self.log.warning('{0} is still running, skipping a tick', name)
+            with self.lock:
+                self.overruns[name] += 1
+            return
+
+        self.running.add(name)
+        future = self.dispatch(name, method, output=output)
+        future.add_done_callback(lambda f: self.running.discard(name))
+
+
+class ThreadScheduler(Scheduler):
+    """
+    One thread per event source, each blocking in a loop of its own
+
+    The interval sources share one thread for the timer wheel, and the hlwm
+    sources one for the idle listener.
+
+    """
+
+    def start(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+
+        for name, method, kind, sources in self.sources():
+            self.start_source(name, method, kind, sources)
+
+        self.thread(self.wheel.run)
+
+    def start_source(self, name, method, kind, sources):
+        self.started.add((name, kind))
+        self.watch(method)
+
+        if kind == 'interval':
+            self.add_interval(name, method, sources)
+            return
+
+        if kind == 'hlwm':
+            # Hooks that come in while a source runs are batched up.
+            self.add_hlwm(name, method, sources, self.dispatch)
+            if not self.listening:
+                self.listening = True
+                self.thread(self.listener.run)
+            return
+
+        if kind == 'static' and self.defer_static(name, method):
+            return
+
+        runner = getattr(self, 'run_%s' % kind)
+        self.thread(runner, name, method, sources)
+
+    def thread(self, target, *args):
+        t = threading.Thread(None, target, args=args)
+        t.daemon = False
+        t.start()
+
+    def submit(self, name, method, *args, output=True):
+        return self.executor.submit(
+            self.collect, name, method, *args, output=output
+        )
+
+    def run_static(self, name, method, sources):
+        self.collect(name, method)
+
+    def run_inotify(self, name, method, sources):
+        import pyinotify as inf
+
+        # A plain callable rather than a ProcessEvent, which would swallow
+        # IN_Q_OVERFLOW.
+        wm = inf.WatchManager()
+        notifier = inf.Notifier(wm, lambda e: self.collect(name, method, e))
+        self.add_watches(wm, sources)
+        self.watches_added(name, method)
+
+        notifier.loop()
+
+    def run_event(self, name, method, sources):
+        selector = selectors.DefaultSelector()
+        for watcher in self.watchers(sources):
+            for fd in watcher.fds():
+                selector.register(fd, selectors.EVENT_READ, watcher)
+
+        if not selector.get_map():
+            return
+
+        while True:
+            for key, mask in selector.select():
+                events = key.data.read()
+                if events:
+                    self.dispatch(name, method, events)
+
+
+class AsyncScheduler(Scheduler):
+    """
+    All sources as tasks on a single asyncio loop
+
+    The loop itself only waits; the collectors are blocking functions and
+    are handed to a small, bounded thread pool.
+
+    """
+
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.loop.set_default_executor(self.executor)
+
+        for name, method, kind, sources in self.sources():
+            self.start_source(name, method, kind, sources)
+
+        self.wheel_task = self.loop.create_task(self.wheel.run_async())
+
+        self.log.debug('Running {0} workers', self.workers)
+        self.loop.run_forever()
+
+    def start_source(self, name, method, kind, sources):
+        self.started.add((name, kind))
+        self.watch(method)
+
+        if kind == 'interval':
+            self.add_interval(name, method, sources)
+            return
+
+        if kind == 'hlwm':
+            self.add_hlwm(name, method, sources, self.dispatch)
+            if not self.listening:
+                self.listening = True
+                self.listener.attach(self.loop)
+            return
+
+        if kind == 'static' and self.defer_static(name, method):
+            return
+
+        coro = getattr(self, 'run_%s' % kind)(name, method, sources)
+        if coro is not None:
+            self.loop.create_task(coro)
+
+    def configure(self, names, restart=()):
+        # Everything on the loop happens in its own thread
+        self.loop.call_soon_threadsafe(self.reconfigure, names, restart)
+
+    def reconfigure(self, names, restart=()):
+        super().configure(names, restart)
+
+        # The wheel may be sleeping towards a slot later than the timers that
+        # were just added.
+        self.wheel_task.cancel()
+        self.wheel_task = self.loop.create_task(self.wheel.run_async())
+
+    def submit(self, name, method, *args, output=True):
+        call = functools.partial(
+            self.collect, name, method, *args, output=output
+        )
+        return self.loop.run_in_executor(self.executor, call)
+
+    def run_static(self, name, method, sources):
+        self.dispatch(name, method)
+
+    def run_inotify(self, name, method, sources):
+        import pyinotify as inf
+
+        wm = inf.WatchManager()
+        notifier = inf.Notifier(
+            wm, lambda e: self.dispatch(name, method, e), timeout=0
+        )
+        self.add_watches(wm, sources)
+        self.watches_added(name, method)
+
+        self.loop.add_reader(wm.get_fd(), self.read_inotify, notifier)
+
+    def read_inotify(self, notifier):
+        notifier.read_events()
+        notifier.process_events()
+
+    def run_event(self, name, method, sources):
+        for watcher in self.watchers(sources):
+            for fd in watcher.fds():
+                self.loop.add_reader(
+                    fd, self.read_event, name, method, watcher
+                )
+
+    def read_event(self, name, method, watcher):
+        events = watcher.read()
+        if events:
+            self.dispatch(name, method, events)
+
+
+def get_scheduler(storm, config):
+    """
+    Pick a scheduler from the `scheduler` and `hlwm` sections of the config
+
+    Only the sources of the bolts in `items` are run.
+
+    """
+
+    settings = config.get('scheduler', {})
+    cls = ThreadScheduler
+    if settings.get('mode', 'threads') == 'asyncio':
+        cls = AsyncScheduler
+
+    idle = config.get('hlwm', {})
+    listener = hlwm.IdleListener(
+        idle.get('command', 'herbstclient'),
+        batch=idle.get('batch', 0.05)
+    )
+
+    return cls(
+        storm,
+        workers=settings.get('workers', 4),
+        report=settings.get('report', 60),
+        listener=listener,
+        names=configured(config)
+    )
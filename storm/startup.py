@@ -0,0 +1,163 @@
+import sys
+import json
+import time
+import subprocess as sub
+from contextlib import contextmanager
+
+# Besides storm's own, the imports that are worth listing
+THIRD_PARTY = ('yaml', 'logbook', 'pyinotify', 'alsaaudio')
+
+
+class Phases():
+    """
+    Wall clock time per step of the startup, as (module, step, seconds)
+
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.timings = []
+
+    @contextmanager
+    def phase(self, module, step):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.timings.append((module, step, self.clock() - start))
+
+
+def child():
+    """
+    Go through the startup of storm up to where the loops would start
+
+    Runs under `python -X importtime`, and prints the timings of the steps as
+    JSON on stdout for `report()`.
+
+    """
+
+    phases = Phases()
+
+    from storm import conf
+    with phases.phase('storm.conf', 'fingerprint'):
+        cached = conf.read_snapshot(conf.fingerprint()) is not None
+    with phases.phase('storm.conf', 'snapshot' if cached else 'yaml'):
+        config = conf.CONFIG
+
+    from storm import storm
+    from storm import cloud
+    from storm import channel
+    from storm import scheduler
+
+    # Always the memory channel, so that the static sources do not write
+    # over the bolts of a storm that is running.
+    chan = channel.Channel()
+
+    with phases.phase('storm.storm', 'StormFormatter()'):
+        formatter = storm.StormFormatter()
+    with phases.phase('storm.storm', 'Storm.setup()'):
+        bar = storm.Storm(formatter, chan)
+        bar.setup()
+
+    with phases.phase('storm.scheduler', 'get_scheduler()'):
+        runner = scheduler.get_scheduler(bar, config)
+    with phases.phase('storm.scheduler', 'sources()'):
+        sources = list(runner.sources())
+
+    # The watchers are created and the static sources run as the scheduler
+    # starts, so they count towards the startup as well.
+    for name, method, kind, specs in sources:
+        if kind == 'event':
+            for spec in specs:
+                step = '%s watcher %s' % (name, spec['watcher'])
+                with phases.phase('storm.storm', step):
+                    list(runner.watchers([spec]))
+        elif kind == 'static':
+            with phases.phase('storm.storm', '%s (static)' % name):
+                runner.collect(name, method)
+
+    clouds = cloud.Cloud(chan)
+    with phases.phase('storm.cloud', 'setup_lines()'):
+        clouds.setup_lines()
+    with phases.phase('storm.cloud', 'get_screen_width()'):
+        clouds.get_screen_width()
+    with phases.phase('storm.cloud', 'setup_renderer()'):
+        clouds.setup_renderer()
+
+    sys.stdout.write(json.dumps(phases.timings) + '\n')
+
+
+def parse_importtime(text):
+    """
+    Every line of `-X importtime`, as (module, self, cumulative)
+
+    The lines look like
+
+        import time:       412 |       1833 |   storm.conf
+
+    with the times in microseconds and the name indented by its depth.
+
+    """
+
+    imports = []
+    for line in text.splitlines():
+        if not line.startswith('import time:'):
+            continue
+
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # The header
+            continue
+
+        imports.append((
+            fields[2].strip(),
+            int(fields[0]) / 1e6,
+            int(fields[1]) / 1e6
+        ))
+    return imports
+
+
+def report(out=None):
+    """
+    Print how long every import and every startup step of storm takes
+
+    The startup runs in a fresh interpreter, so that every import is timed.
+
+    """
+
+    out = out or sys.stdout
+    proc = sub.run(
+        [
+            sys.executable, '-X', 'importtime', '-c',
+            'from storm import startup; startup.child()'
+        ],
+        stdout=sub.PIPE,
+        stderr=sub.PIPE,
+    )
+
+    lines = proc.stdout.decode().strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        out.write(proc.stderr.decode())
+        raise SystemExit('The startup failed, see above')
+
+    imports = parse_importtime(proc.stderr.decode())
+    phases = json.loads(lines[-1])
+
+    out.write('%-40s %10s %10s\n' % ('import', 'self ms', 'cumul. ms'))
+    for module, own, cumulative in imports:
+        if module.partition('.')[0] != 'storm' and module not in THIRD_PARTY:
+            continue
+        out.write('%-40s %10.2f %10.2f\n' % (
+            module, own * 1e3, cumulative * 1e3
+        ))
+
+    out.write('\n%-18s %-32s %10s\n' % ('module', 'step', 'ms'))
+    for module, step, seconds in phases:
+        out.write('%-18s %-32s %10.2f\n' % (module, step, seconds * 1e3))
+
+    out.write('\n%-51s %10.2f\n' % (
+        'all imports', sum(i[1] for i in imports) * 1e3
+    ))
+    out.write('%-51s %10.2f\n' % (
+        'all steps', sum(p[2] for p in phases) * 1e3
+    ))
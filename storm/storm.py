@@ -1,26 +1,37 @@
 #!/usr/bin/env python -u
 
 import os
-import re
 import sys
-import time
-import glob
 import socket
+import argparse
 import threading
 import datetime
-import asyncore
 import subprocess as sub
-import pyinotify as inf
 
 from os.path import join
-from collections import defaultdict
+from functools import lru_cache
+from collections import Counter
 
-import alsaaudio
-import psutil
 import logbook
 
 from storm import conf
+from storm import channel
 from storm import cloud
+from storm import dzen
+from storm import hlwm
+from storm import maildir
+from storm import metrics
+from storm import mixer
+from storm import netlink
+from storm import offload
+from storm import pacman
+from storm import procfs
+from storm import profile
+from storm import startup
+from storm import sysfs
+from storm import trace
+from storm import uevent
+from storm import scheduler
 from storm import util
 
 
@@ -36,19 +47,53 @@ class StormFormatter(util.LoggedClass):
             join(sys.argv[0], '..', '..', 'storm', 'icons')
         )
 
+        # The "^fg(..)^bg(..)" of every pair of colors, built once
+        self.prefixes = dict(
+            ((fg, bg), "^fg(%s)^bg(%s)" % (self.colors[fg], self.colors[bg]))
+            for fg in self.colors
+            for bg in self.colors
+        )
+
+        # Icons and tag buttons come in a handful of variations only
+        self.icon = lru_cache(maxsize=128)(self.icon)
+        self.tag = lru_cache(maxsize=128)(self.tag)
+
         super().__init__()
 
     def colorize(self, text, fg=None, bg=None):
-        fg = self.colors[fg] if fg else self.colors["fg_1"]
-        bg = self.colors[bg] if bg else self.colors["bg_1"]
-        return "^fg(%s)^bg(%s)%s^fg()^bg()" % (fg, bg, text)
+        prefix = self.prefixes[fg or "fg_1", bg or "bg_1"]
+        return "%s%s^fg()^bg()" % (prefix, text)
 
     def icon(self, icon, fg=None, bg=None):
         if fg is None:
             fg = "icon"
         icon = "^i(%s)" % join(self.icons, "%s.xbm" % icon)
 
-        return "%s" % self.colorize(icon, fg=fg, bg=bg)
+        return self.colorize(icon, fg=fg, bg=bg)
+
+    def tag(self, tag, state):
+        if state == "#":
+            # Active tag
+            tag_design = self.colorize(" %s " % tag, fg="bg_1", bg="fg_3")
+        elif state == "+":
+            # Urgent tag
+            tag_design = self.colorize(" %s " % tag, fg="bg_1", bg="crit")
+        elif state == "!":
+            # Urgent tag
+            tag_design = self.colorize(" %s " % tag, fg="bg_1", bg="crit")
+        elif state == ".":
+            # Emtpty tag
+            return ""
+        else:
+            # Regular ol' tag
+            tag_design = self.colorize(" %s " % tag)
+
+        ctl = "^ca(1,herbstclient focus_monitor 0 && "
+        ctl += "herbstclient use %s)%s^ca()"
+        return ctl % (
+            tag,
+            tag_design
+        )
 
     def tags(self, data):
         """
@@ -61,32 +106,8 @@ class StormFormatter(util.LoggedClass):
         for tag in data.split('\t'):
             if len(tag) == 0 or tag[:1] == '\n':
                 continue
-            else:
-                state = tag[0]
-                tag = tag[1:]
-
-            if state == "#":
-                # Active tag
-                tag_design = self.colorize(" %s " % tag, fg="bg_1", bg="fg_3")
-            elif state == "+":
-                # Urgent tag
-                tag_design = self.colorize(" %s " % tag, fg="bg_1", bg="crit")
-            elif state == "!":
-                # Urgent tag
-                tag_design = self.colorize(" %s " % tag, fg="bg_1", bg="crit")
-            elif state == ".":
-                # Emtpty tag
-                continue
-            else:
-                # Regular ol' tag
-                tag_design = self.colorize(" %s " % tag)
-
-            ctl = "^ca(1,herbstclient focus_monitor 0 && "
-            ctl += "herbstclient use %s)%s^ca()"
-            tags += ctl % (
-                tag,
-                tag_design
-            )
+
+            tags += self.tag(tag[1:], tag[0])
 
         return tags
 
@@ -119,19 +140,31 @@ class StormFormatter(util.LoggedClass):
 
     def network(self, data):
         """
-        Example data to be a string:
+        Example data to be a dict:
 
-        data = "192.168.1.23" or data = "N/A"
+        data = {
+            "ip": "192.168.1.23",
+            "interface": "wlan0",
+            "up": 1024.0,
+            "down": 81920.0
+        }
+
+        The ip is "N/A" when no interface is up. The rates are in bytes/s.
 
         """
-        if data == "N/A":
-            ip = self.colorize(data, "dead")
+        if data["ip"] == "N/A":
+            ip = self.colorize(data["ip"], "dead")
             icon = self.icon("wifi_01", fg="dead")
-        else:
-            ip = self.colorize(data)
-            icon = self.icon("wifi_01")
-
-        return "%s %s" % (icon, ip)
+            return "%s %s" % (icon, ip)
+
+        return "%s %s %s %s %s %s" % (
+            self.icon("wifi_01"),
+            self.colorize(data["ip"]),
+            self.icon("net_up_01", fg=None if data["up"] else "fg_2"),
+            self.colorize(util.human_rate(data["up"])),
+            self.icon("net_down_01", fg=None if data["down"] else "fg_2"),
+            self.colorize(util.human_rate(data["down"]))
+        )
 
     def load(self, data):
         """
@@ -153,9 +186,9 @@ class StormFormatter(util.LoggedClass):
                 load_avgs += "%s " % self.colorize("%.2f" % avg, fg="crit")
                 elevation = "crit"
 
-            icon = self.icon("scorpio")
-            if elevation:
-                icon = self.icon("scorpio", fg=elevation)
+        icon = self.icon("scorpio")
+        if elevation:
+            icon = self.icon("scorpio", fg=elevation)
 
         return "%s %s" % (icon, load_avgs[:-1])
 
@@ -170,10 +203,10 @@ class StormFormatter(util.LoggedClass):
             processes = self.colorize(data)
             icon = self.icon("cpu")
         elif data < 600:
-            processes = self.colorize(processes, "warn")
+            processes = self.colorize(data, "warn")
             icon = self.icon("cpu", fg="warn")
         else:
-            processes = self.colorize(processes, "crit")
+            processes = self.colorize(data, "crit")
             icon = self.icon("cpu", fg="warn")
 
         return "%s %s" % (icon, processes)
@@ -244,7 +277,7 @@ class StormFormatter(util.LoggedClass):
         data = "rey"
 
         """
-        return self.colorize(socket.gethostname())
+        return self.colorize(data)
 
     def kernel(self, data):
         """
@@ -273,16 +306,20 @@ class StormFormatter(util.LoggedClass):
         fg = None
         icon_fg = None
 
+        if percent is None:
+            # No batteries at all
+            return self.icon("ac_01")
+
         if percent < 10:
-            icon = "bat_empty_01",
+            icon = "bat_empty_01"
             icon_fg = "crit"
             fg = "crit"
         elif percent < 20:
-            icon = "bat_empty_01",
+            icon = "bat_empty_01"
             icon_fg = "warn"
             fg = "warn"
         elif percent < 30:
-            icon = "bat_low_01",
+            icon = "bat_low_01"
             icon_fg = "warn"
         elif percent < 50:
             icon = "bat_low_01"
@@ -308,107 +345,125 @@ class StormFormatter(util.LoggedClass):
     def mail(self, data):
         return "%s %s" % (self.icon('mail'), self.colorize(data))
 
+    def stale(self, text):
+        """
+        A bolt whose source did not come back in time
+
+        """
+
+        return "%s %s" % (text, self.colorize("?", fg="dead"))
+
 
 class StfuFormatter():
     pass
 
 
 class Hooker():
-    def __init__(self):
-        self.hookers = defaultdict(set)
+    """
+    Decorators that mark Storm methods as sources of data
 
-    def interval(self, sleep):
-        def real_decorator(function):
-            def wrapper(self, *args, **kwargs):
-                while True:
-                    ret = function(self)
+    The methods are not wrapped; each decorator only records how the method
+    should be driven in its `sources` list, and the scheduler does the rest.
+    Decorators can be stacked, e.g. to hook a method on several hlwm hooks.
 
-                    fn = function.__name__
-                    self.write(fn, ret, sleep > 5)
+    """
 
-                    time.sleep(sleep)
+    def register(self, function, kind, **options):
+        options['kind'] = kind
+        function.sources = getattr(function, 'sources', []) + [options]
+        function.runner = True
+        return function
 
-            wrapper.runner = True
-            return wrapper
+    def interval(self, sleep):
+        def real_decorator(function):
+            return self.register(function, 'interval', sleep=sleep)
         return real_decorator
 
     def hlwm(self, hook):
         def real_decorator(function):
-            fn = function.__name__
-
-            def wrapper(storm, *args, **kwargs):
-                process = sub.Popen(
-                    ['herbstclient', '--idle'],
-                    stdout=sub.PIPE
-                )
-                while True:
-                    output = process.stdout.readline()
-                    if not output:
-                        break
-
-                    output = output.decode().replace('\n', '')
-                    parts = output.split('\t')
-
-                    if parts[0] in self.hookers[fn]:
-                        hc_hook = []
-                        for part in parts:
-                            if len(part) > 0:
-                                hc_hook.append(part)
-
-                        ret = function(storm, hc_hook)
-                        storm.write(fn, ret)
-
-            # Store the hook name on the hooker object so that we can re-use
-            # the same decorator for multiple hooks
-            self.hookers[fn].add(hook)
-
-            # Also, keep the original name for the decorator function so that
-            # the line above does not get the function 'wrapper' for the next
-            # run.
-            wrapper.__name__ = fn
-            wrapper.runner = True
-            return wrapper
+            return self.register(function, 'hlwm', hook=hook)
         return real_decorator
 
     def static(self, function):
-        def wrapper(self, *args, **kwargs):
-            ret = function(self)
+        return self.register(function, 'static')
 
-            fn = function.__name__
-            self.write(fn, ret)
+    def inotify(self, path, mask, exclude=None):
+        """
+        Run the method with every inotify event under `path`
+
+        `path` can also be a function that returns it, for paths from the
+        config, which is not loaded yet when the class is defined.
+
+        `exclude` is a function that is given the path of every directory
+        that is about to be watched, and returns True to skip it.
+
+        """
+
+        def real_decorator(function):
+            return self.register(
+                function, 'inotify', path=path, mask=mask, exclude=exclude
+            )
+        return real_decorator
+
+    def execute(self, how, deadline=None):
+        """
+        Run the method `inline` or on a `thread`
+
+        Inline methods run in the thread that triggers them, e.g. the timer
+        wheel, and should be quick. The others run on the worker pool. Once a
+        call has run for `deadline` seconds its bolt is marked as stale.
+        Threads cannot be killed, so a thread that overruns keeps its worker
+        until it is done; a method that runs a command that can hang should
+        kill it itself and raise `offload.Timeout`, like `hlwm.Client`.
+
+        Nothing is forked for a call: storm has threads that can hold locks,
+        e.g. of the logging, and a child of a threaded process that needs
+        one of them would wait for it forever.
+
+        """
 
-        wrapper.runner = True
-        return wrapper
+        if how not in offload.CLASSES:
+            raise ValueError('Unknown execution class: {0}'.format(how))
 
-    def inotify(self, path, mask):
         def real_decorator(function):
-            class EventHandler(inf.ProcessEvent):
-                def __init__(self, storm, *args, **kwargs):
-                    self.storm = storm
-                    super().__init__(*args, **kwargs)
-
-                def process_default(self, event):
-                    ret = function(self.storm)
-                    fn = function.__name__
-                    self.storm.write(fn, ret)
-
-            def wrapper(self, *args, **kwargs):
-                wm = inf.WatchManager()
-                inf.AsyncNotifier(wm, EventHandler(self))
-                wm.add_watch(path, mask, rec=True)
-                asyncore.loop()
-
-            wrapper.runner = True
-            return wrapper
+            function.execution = {'how': how, 'deadline': deadline}
+            return function
+        return real_decorator
+
+    def event(self, watcher):
+        """
+        Run the method whenever the watcher in attribute `watcher` has events
+
+        A watcher has `fds()`, the file descriptors to wait on, and `read()`,
+        which returns a list of the events that the method should see. The
+        method is called with that list.
+
+        """
+
+        def real_decorator(function):
+            return self.register(function, 'event', watcher=watcher)
         return real_decorator
 
 
 class Storm(util.LoggedClass):
     hooker = Hooker()
 
-    def __init__(self, formatter):
+    def __init__(self, formatter, channel=None):
         self.formatter = formatter
+        self.channel = channel
         self.monitor = "0"
+
+        # The last value written for each bolt, and how many writes that
+        # saved us. The unformatted data is kept for a change of colors.
+        # Bolts that are marked as stale keep their last good text here.
+        self.last = {}
+        self.stale_names = set()
+        self.data = {}
+        self.writes = Counter()
+        self.skips = Counter()
+        self.lock = threading.Lock()
+        metrics.registry.provide('writes', self.stats)
+
         super().__init__()
 
     def setup(self):
@@ -422,40 +477,131 @@ class Storm(util.LoggedClass):
         os.makedirs(p, exist_ok=True)
         self.cwd = p
 
+        settings = conf.CONFIG.get('hlwm', {})
+        self.herbstclient = hlwm.Client(
+            settings.get('command', 'herbstclient'),
+            timeout=settings.get('timeout', 2)
+        )
+
         # self.checkhost = "google.com"
         # self.pac_count = "/dev/shm/fakepacdb/counts"
 
     def run(self):
         self.log.debug('Starting')
-        # TODO: Unhack this from dir() pls :(
-        for name in dir(self):
-            value = getattr(self, name)
-            if hasattr(value, 'runner'):
-                t = threading.Thread(None, value)
-                t.daemon = False
-                t.start()
+        self.scheduler = scheduler.get_scheduler(self, conf.CONFIG)
+        metrics.registry.provide('sources', self.scheduler.stats)
+        self.scheduler.start()
 
     def write(self, fn, data, output=True):
-        if output:
-            self.log.info("Writing {0}", fn)
-
+        self.data[fn] = data
+        metrics.registry.touch(fn)
+        trace.record('write', name=fn, data=data)
         if hasattr(self.formatter, fn):
             func = getattr(self.formatter, fn)
-            data = func(data)
+            with metrics.registry.timer('format.%s' % fn):
+                data = func(data)
+        data = str(data)
+
+        with self.lock:
+            # Rewriting an unchanged value would only make the cloud render
+            # the very same line again; unless that clears a stale mark.
+            if self.last.get(fn) == data and fn not in self.stale_names:
+                self.skips[fn] += 1
+                return
+
+            if output:
+                self.log.info("Writing {0}", fn)
+
+            self.publish(fn, data)
+            self.last[fn] = data
+            self.stale_names.discard(fn)
+            self.writes[fn] += 1
+
+    def publish(self, fn, data):
+        if self.channel is not None:
+            self.channel.publish(fn, data)
+        else:
+            util.atomic_write(join(self.cwd, fn), data)
+
+    def stale(self, fn):
+        """
+        Mark the bolt of `fn` as out of date, until its source writes again
+
+        """
+
+        trace.record('stale', name=fn)
+        with self.lock:
+            # A source that times out again is marked only once; the mark
+            # goes on the last good text, which is kept as it was.
+            if fn in self.stale_names:
+                return
+            self.stale_names.add(fn)
+
+            text = self.last.get(fn, '')
+            if hasattr(self.formatter, 'stale'):
+                text = self.formatter.stale(text)
+            else:
+                text += ' (stale)'
+            self.publish(fn, text)
+
+    def reload(self, old, new, changed):
+        """
+        Apply a new config; subscriber of `conf.Reloader`
+
+        Only what the changed sections are used for is rebuilt. The other
+        sources are not run again, and their bolts keep their last values.
 
-        path = join(self.cwd, fn)
-        with open(path, 'w') as fp:
-            fp.write(str(data))
+        """
+
+        if 'colors' in changed:
+            self.formatter = type(self.formatter)()
+            stale = set(self.stale_names)
+            for fn, data in list(self.data.items()):
+                self.write(fn, data, output=False)
+            # The new colors do not bring those sources back
+            for fn in stale:
+                self.stale(fn)
+
+        if 'items' in changed:
+            # Bolts that are back on the bar get the last value of their
+            # source, which would otherwise be skipped as unchanged.
+            before = scheduler.configured(old) or set()
+            for fn in (scheduler.configured(new) or set()) - before:
+                if fn in self.data:
+                    self.last.pop(fn, None)
+                    self.write(fn, self.data[fn], output=False)
+
+        restart = set()
+        if 'packages' in changed:
+            if 'pacman_refresh' in self.__dict__:
+                self.pacman_refresh.cancel()
+            for name in ('pacman_settings', 'pacman_db', 'pacman_refresh'):
+                self.__dict__.pop(name, None)
+            restart.add('packages')
+
+        runner = getattr(self, 'scheduler', None)
+        if runner is not None and ('items' in changed or restart):
+            runner.configure(scheduler.configured(new), restart)
+
+    def stats(self):
+        """
+        Writes performed and skipped as unchanged, per bolt
+
+        """
+
+        with self.lock:
+            return {
+                "written": dict(self.writes),
+                "skipped": dict(self.skips),
+            }
 
+    @hooker.execute('thread', deadline=2)
     @hooker.hlwm("tag_flags")
     @hooker.hlwm("tag_changed")
     def tags(self, hook):
-        output = sub.Popen(
-            ['herbstclient', 'tag_status'],
-            stdout=sub.PIPE
-        ).communicate()[0].decode()
-        return output
+        return self.herbstclient.call('tag_status')
 
+    @hooker.execute('inline')
     @hooker.hlwm("window_title_changed")
     @hooker.hlwm("focus_changed")
     def windowtitle(self, hook):
@@ -464,6 +610,7 @@ class Storm(util.LoggedClass):
             ret = hook[2]
         return ret
 
+    @hooker.execute('inline')
     @hooker.interval(1)
     def date(self):
         now = datetime.datetime.now()
@@ -473,133 +620,169 @@ class Storm(util.LoggedClass):
             "time": now.strftime("%H:%M:%S")
         }
 
-    # TODO: Use inotify on interface data
-    @hooker.interval(20)
-    def network(self):
-        try:
-            ip = socket.gethostbyname(socket.gethostname())
-            # TODO: Please fix
-            if "127.0.0" in ip:
-                raise OSError
-        except (OSError, Exception):
-            ip = "N/A"
+    @util.shared_property
+    def addresses(self):
+        return netlink.Addresses()
+
+    @util.shared_property
+    def throughput(self):
+        return netlink.Throughput()
 
-        return ip
+    # Address and link changes come from rtnetlink right away; the interval
+    # is for the rates.
+    @hooker.execute('thread', deadline=2)
+    @hooker.interval(2)
+    @hooker.event('addresses')
+    def network(self, events=()):
+        ip, interface = self.addresses.current()
+        rates = self.throughput.sample().get(interface, {})
 
-    @hooker.interval(7)
+        return {
+            "ip": ip,
+            "interface": interface,
+            "up": rates.get("up", 0),
+            "down": rates.get("down", 0)
+        }
+
+    @util.shared_property
+    def proc(self):
+        return procfs.Sampler()
+
+    # These three share one snapshot of /proc per tick.
+    @hooker.execute('thread', deadline=2)
+    @hooker.interval(5)
     def load(self):
-        return os.getloadavg()
+        return self.proc.sample()["load"]
 
+    @hooker.execute('thread', deadline=2)
     @hooker.interval(5)
     def processes(self):
-        return len(psutil.get_pid_list())
+        return self.proc.sample()["processes"]
 
+    @hooker.execute('thread', deadline=2)
     @hooker.interval(5)
     def mem_swap(self):
-        mem = psutil.virtual_memory()
-        swap = psutil.swap_memory()
+        mem = self.proc.sample()["meminfo"]
         return {
-            "memory": mem.free,
-            "swap": swap.used
+            "memory": mem["MemFree"] * 1024,
+            "swap": (mem["SwapTotal"] - mem["SwapFree"]) * 1024
         }
 
-    @hooker.interval(600)
-    def packages(self):
-        fakedb = join("/dev", "shm", "fakepacdb")
-        fakelock = join(fakedb, "db.lck")
-        # realdb = join("/var", "lib", "pacman")
-
-        os.makedirs(join(fakedb, "sync"), exist_ok=True)
+    @util.shared_property
+    def pacman_settings(self):
+        return conf.CONFIG.get('packages', {})
 
-        if os.path.exists(fakelock):
-            os.remove(join(fakedb, "db.lck"))
-
-        # if not os.path.islink(join(fakedb, "local")):
-            # os.symlink(join(realdb, "local"), fakedb)
+    @util.shared_property
+    def pacman_db(self):
+        settings = self.pacman_settings
+        return pacman.Packages(
+            settings.get('dbpath', '/var/lib/pacman'),
+            join(settings.get('fakedb', '/dev/shm/fakepacdb'), 'sync'),
+        )
 
-        sub.Popen(
-            ['fakeroot', 'pacman', '--dbpath', fakedb, '-Sy'],
-            stdout=sub.DEVNULL
-        ).communicate()
+    @util.shared_property
+    def pacman_refresh(self):
+        settings = self.pacman_settings
+        return pacman.Refresh(
+            settings.get('fakedb', '/dev/shm/fakepacdb'),
+            settings.get('timeout', 120),
+        )
 
-        pkgs = sub.Popen(
-            ['pacman', '-Q'],
-            stdout=sub.PIPE
-        ).communicate()[0].decode()
-        pkgs = len(pkgs.split("\n")) if len(pkgs) > 0 else 0
+    # The counts come from the databases right away; the -Sy runs in the
+    # background and writes the counts again once it is done.
+    @hooker.execute('thread', deadline=30)
+    @hooker.interval(600)
+    def packages(self):
+        self.pacman_refresh.start(
+            lambda: self.write('packages', self.pacman_db.counts())
+        )
+        return self.pacman_db.counts()
 
-        new_pkgs = sub.Popen(
-            ['pacman', '--dbpath', fakedb, '-Qqu'],
-            stdout=sub.PIPE
-        ).communicate()[0].decode()
-        new_pkgs = len(new_pkgs.split("\n")) if len(new_pkgs) > 0 else 0
+    @util.shared_property
+    def mixers(self):
+        return mixer.Mixers(conf.CONFIG['volume']['mixer'])
 
-        return {
-            "installed": pkgs,
-            "new": new_pkgs
-        }
-
-        mixer = alsaaudio.Mixer(conf.CONFIG['volume']['mixer'])
-        master = alsaaudio.Mixer()
-        return {
-            "volume": mixer.getvolume()[0],
-            "muted": master.getmute()[0]
-        }
+    # ALSA signals every change on the poll descriptors of the mixers, so
+    # there is nothing to poll; the static run is for the initial value. The
+    # mixers are read in the thread that handles their events.
+    @hooker.execute('inline')
+    @hooker.static
+    @hooker.event('mixers')
+    def volume(self, events=()):
+        return self.mixers.sample()
 
     @hooker.static
     def hostname(self):
         return socket.gethostname()
 
+    @hooker.execute('inline')
     @hooker.static
     def kernel(self):
-        out = sub.Popen(['uname', '-r'], stdout=sub.PIPE).communicate()
-        kernel = str(re.sub(r'\s', '', out[0].decode()))
-        return kernel
+        return os.uname().release
 
-    @hooker.interval(10)
-    def power(self):
-        acpi = sub.Popen(['acpi', '-ab'], stdout=sub.PIPE)
-        acpi = acpi.communicate()[0].decode().strip().split("\n")
+    @util.shared_property
+    def power_supplies(self):
+        return sysfs.PowerSupplies()
 
-        batteries = []
-        for acpi_line in filter(lambda x: x.startswith('Battery'), acpi):
-            bat = util.AcpiBattery(acpi_line)
-            bat.parse()
-            batteries.append(bat)
+    @util.shared_property
+    def power_events(self):
+        return uevent.Monitor('power_supply')
 
-        percents = [b.percent for b in batteries]
-        percent = sum(percents) / len(percents)
-        total = sum(b.time.seconds for b in batteries)
+    # Plugging in the AC comes as a uevent right away; the interval is for
+    # the slow drift of the batteries.
+    @hooker.execute('thread', deadline=5)
+    @hooker.interval(10)
+    @hooker.event('power_events')
+    def power(self, events=()):
+        if any(e.get('ACTION') in ('add', 'remove') for e in events):
+            self.power_supplies.scan()
+
+        return self.power_supplies.sample()
+
+    @util.shared_property
+    def mail_index(self):
+        return maildir.Index(conf.CONFIG['mail']['mailroot'])
+
+    # The index is built by the first, static, run, which the scheduler holds
+    # back until the watches are in place, and then kept up to date from the
+    # events. Those have to be applied one at a time and in order,
+    # or a message that is moved out of new/ right after it arrived can be
+    # counted forever; applying one is cheap enough to do inline.
+    @hooker.execute('inline')
+    @hooker.static
+    @hooker.inotify(
+        lambda: conf.CONFIG['mail']['mailroot'],
+        maildir.MASK,
+        exclude=maildir.skip
+    )
+    def mail(self, event=None):
+        if event is not None:
+            self.mail_index.apply(event)
+        return self.mail_index.count()
 
-        return {
-            "percent": percent,
-            "ac_connected": "on-line" in acpi[-1],
-            "time_left": util.time_left(total)
-        }
 
-    @hooker.inotify(conf.CONFIG['mail']['mailroot'], inf.IN_MODIFY)
-    def mail(self):
-        mail = glob.glob(join(conf.CONFIG['mail']['mailroot'], '*/*/new/*'))
-        mail = filter(lambda m: '/archive/' not in m, mail)
-        return len(list(mail))
+def main_split(profile=None, record=None):
+    """
+    The cloud in a child process of its own, piped into dzen2
 
+    With `profile`, the cloud is profiled as well, into a report of its own.
+    With `record`, it records a trace of its own next to that file.
 
-def main():
-    if len(sys.argv) > 1:
-        # Argument given, start the cloudz!
-        logger.info('Summoning clouds...')
-        cloud.main()
-        sys.exit(0)
+    """
 
     def cloud_thread():
-        font = "-*-montecarlo-medium-*-*-*-11-*-*-*-*-*-*-*"
+        font = conf.CONFIG['font']['name']
+        args = dzen.arguments(conf.CONFIG.get('dzen', {}), font)
+
+        command = [sys.argv[0], 'cloud']
+        if profile:
+            command.append('--profile=%s' % profile)
+        if record:
+            command.append('--record=%s.cloud' % record)
 
-        p1 = sub.Popen([sys.argv[0], 'cloud'], stdout=sub.PIPE, bufsize=0)
+        p1 = sub.Popen(command, stdout=sub.PIPE, bufsize=0)
         p2 = sub.Popen(
-            [
-                'dzen2', '-dock', '-ta', 'l', '-sa', 'rc',
-                '-fn', font, '-h', '17'
-            ],
+            args,
             bufsize=0,
             stdin=p1.stdout,
             stderr=sub.PIPE,
@@ -617,6 +800,17 @@ def main():
         # formatter = StfuFormatter()
         storm = Storm(formatter)
         storm.setup()
+
+        try:
+            reloader = conf.Reloader()
+        except (OSError, ImportError):
+            logger.exception('Cannot watch the config for changes')
+        else:
+            reloader.subscribe(storm.reload)
+            t = threading.Thread(None, reloader.run)
+            t.daemon = True
+            t.start()
+
         storm.run()
 
     ct = threading.Thread(None, cloud_thread)
@@ -627,6 +821,109 @@ def main():
     st.daemon = False
     st.start()
 
+    # The worker pools refuse new work once the main thread has exited.
+    ct.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='storm',
+        description='inotify-based dzen2 runner'
+    )
+    parser.add_argument(
+        'mode', nargs='?', choices=('cloud', 'stats', 'replay'),
+        help='only run the cloud, as the child of `process: split`, '
+             'print the stats of the storm that is running, or replay '
+             'traces'
+    )
+    parser.add_argument(
+        'traces', nargs='*', metavar='TRACE',
+        help='the traces to replay, e.g. FILE and FILE.cloud'
+    )
+    parser.add_argument(
+        '--startup-profile', action='store_true',
+        help='print import and init timings per module, then exit'
+    )
+    parser.add_argument(
+        '--profile', type=float, metavar='SECONDS',
+        help='profile all threads for SECONDS, write the reports to the '
+             'cache dir, then exit'
+    )
+    parser.add_argument(
+        '--record', metavar='FILE',
+        help='record every source call, value and cloud event to FILE'
+    )
+    parser.add_argument(
+        '--speed', type=float, default=0,
+        help='with replay: play the traces at this many times the recorded '
+             'speed; 0, the default, does not wait at all'
+    )
+    args = parser.parse_args()
+
+    if args.startup_profile:
+        startup.report()
+        return
+
+    if args.mode == 'stats':
+        metrics.report()
+        return
+
+    if args.mode == 'replay':
+        if not args.traces:
+            parser.error('replay needs at least one trace')
+        trace.replay(args.traces, args.speed)
+        return
+
+    if args.mode == 'cloud':
+        # Start the cloudz!
+        logger.info('Summoning clouds...')
+        metrics.serve('cloud')
+        if args.profile:
+            profile.start(args.profile, 'cloud')
+        if args.record:
+            trace.start(args.record, 'cloud')
+        cloud.main()
+        sys.exit(0)
+
+    metrics.serve('storm')
+    if args.profile:
+        profile.start(args.profile, 'storm')
+    if args.record:
+        trace.start(args.record)
+
+    if conf.CONFIG.get('process', 'single') == 'split':
+        return main_split(args.profile, args.record)
+
+    # Everything in this process; the cloud writes straight into a dzen2 that
+    # we own. With the memory channel the cache files are not used either.
+    chan = None
+    if conf.CONFIG.get('ipc', 'file') == 'memory':
+        chan = channel.Channel()
+
+    logger.info('Conjuring the storm...')
+    formatter = StormFormatter()
+    storm = Storm(formatter, chan)
+    storm.setup()
+
+    font = conf.CONFIG['font']['name']
+    bar = dzen.Dzen(dzen.arguments(conf.CONFIG.get('dzen', {}), font))
+    clouds = cloud.Cloud(chan, bar)
+    clouds.setup()
+    bar.start()
+
+    # The cloud applies the new config first, so that the bolts of new
+    # sources are on the line by the time their first values come in.
+    reloader = clouds.watch_config()
+    if reloader is not None:
+        reloader.subscribe(storm.reload)
+
+    st = threading.Thread(None, storm.run)
+    st.daemon = False
+    st.start()
+
+    logger.info('Summoning clouds...')
+    clouds.start()
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,150 @@
+import os
+import threading
+from os.path import join
+
+from storm import util
+
+POWER_SUPPLY = '/sys/class/power_supply'
+
+ATTRIBUTES = (
+    'type', 'status', 'online', 'capacity',
+    'energy_now', 'energy_full', 'power_now',
+    'charge_now', 'charge_full', 'current_now',
+)
+
+
+class Attribute():
+    """
+    A sysfs attribute that is kept open and re-read with pread()
+
+    """
+
+    def __init__(self, path):
+        self.fd = os.open(path, os.O_RDONLY)
+
+    def read(self):
+        # Attributes of a removed device raise ENODEV
+        try:
+            return os.pread(self.fd, 4096, 0).decode().strip()
+        except OSError:
+            return None
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PowerSupply():
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        self.attributes = {}
+        for attr in ATTRIBUTES:
+            try:
+                self.attributes[attr] = Attribute(join(path, attr))
+            except OSError:
+                continue
+
+        self.type = self.get('type')
+
+    def get(self, attr):
+        attribute = self.attributes.get(attr)
+        return attribute.read() if attribute else None
+
+    def number(self, attr):
+        value = self.get(attr)
+        return int(value) if value else None
+
+    def percent(self):
+        capacity = self.number('capacity')
+        if capacity is not None:
+            return capacity
+
+        for prefix in ('energy', 'charge'):
+            now = self.number(prefix + '_now')
+            full = self.number(prefix + '_full')
+            if now is not None and full:
+                return int(now * 100 / full)
+
+        return 0
+
+    def seconds_left(self):
+        """
+        Seconds until empty when discharging, until full when charging
+
+        The energy is in uWh and the power in uW; charge and current are in
+        uAh and uA respectively, so the ratio is hours either way.
+
+        """
+
+        status = self.get('status')
+        pairs = (('energy', 'power_now'), ('charge', 'current_now'))
+        for prefix, rate_attr in pairs:
+            now = self.number(prefix + '_now')
+            full = self.number(prefix + '_full')
+            rate = self.number(rate_attr)
+            if now is None or not rate:
+                continue
+
+            if status == 'Discharging':
+                return int(now * 3600 / rate)
+            if status == 'Charging' and full:
+                return int(max(full - now, 0) * 3600 / rate)
+            return 0
+
+        return 0
+
+    def close(self):
+        for attribute in self.attributes.values():
+            attribute.close()
+
+
+class PowerSupplies(util.LoggedClass):
+    """
+    The batteries and adapters under /sys/class/power_supply
+
+    Every attribute is opened once, and a sample is a pread() per attribute
+    rather than a fork of `acpi`. Pass another `root` to read a fake tree.
+
+    Uevents and interval ticks can scan and sample from different threads
+    at once, so both hold a lock; otherwise a scan could close the fds
+    that a sample is reading, and their numbers be reused for other files.
+
+    """
+
+    def __init__(self, root=POWER_SUPPLY):
+        self.root = root
+        self.supplies = []
+        self.lock = threading.Lock()
+        super().__init__()
+        self.scan()
+
+    def scan(self):
+        with self.lock:
+            for supply in self.supplies:
+                supply.close()
+
+            self.supplies = []
+            for name in sorted(os.listdir(self.root)):
+                self.supplies.append(PowerSupply(join(self.root, name)))
+
+        self.log.debug(
+            'Found power supplies: {0}',
+            ', '.join(s.name for s in self.supplies)
+        )
+
+    def sample(self):
+        with self.lock:
+            batteries = [s for s in self.supplies if s.type == 'Battery']
+            mains = [s for s in self.supplies if s.type == 'Mains']
+
+            percent = None
+            if batteries:
+                percents = [b.percent() for b in batteries]
+                percent = int(sum(percents) / len(percents))
+
+            return {
+                "percent": percent,
+                "ac_connected": any(m.get('online') == '1' for m in mains),
+                "time_left": util.time_left(
+                    sum(b.seconds_left() for b in batteries)
+                )
+            }
@@ -0,0 +1,159 @@
+import math
+import time
+import asyncio
+import threading
+
+from collections import defaultdict
+
+from storm import util
+
+
+class Timer():
+    def __init__(self, interval, callback):
+        self.interval = interval
+        self.callback = callback
+
+    def next_deadline(self, after):
+        """
+        The first multiple of the interval, counted from the epoch, that
+        comes after `after`
+
+        """
+
+        return (math.floor(after / self.interval) + 1) * self.interval
+
+
+class TimerWheel(util.LoggedClass):
+    """
+    Fires interval callbacks lined up on wall-clock boundaries
+
+    Every timer fires on multiples of its interval since the epoch rather than
+    `interval` seconds after its last run finished. That keeps the 1s clock
+    on the second, and makes e.g. a 1s and a 5s timer share every fifth
+    wakeup instead of drifting apart. All timers that are due on the same
+    slot are fired in one wakeup.
+
+    Timers can be added and removed from other threads while it runs.
+
+    """
+
+    # Waking up this much ahead of a slot still counts as being on time.
+    slack = 0.005
+
+    def __init__(self, resolution=0.1, clock=time.time):
+        self.resolution = resolution
+        self.clock = clock
+        self.slots = defaultdict(list)
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+
+        self.wakeups = 0
+        self.fired = 0
+        self.last_report = None
+
+        super().__init__()
+
+    def slot(self, when):
+        return int(round(when / self.resolution))
+
+    def add(self, interval, callback):
+        """
+        Add a timer that is due right away, and then on every boundary
+
+        """
+
+        timer = Timer(interval, callback)
+        with self.lock:
+            self.slots[self.slot(self.clock())].append(timer)
+
+        # A run() that sleeps towards a later slot has to look again
+        self.wake.set()
+        return timer
+
+    def remove(self, timer):
+        with self.lock:
+            for slot, timers in list(self.slots.items()):
+                if timer in timers:
+                    timers.remove(timer)
+                    if not timers:
+                        del self.slots[slot]
+
+    def delay(self):
+        """
+        Seconds until the next slot is due, or None if there are no timers
+
+        """
+
+        with self.lock:
+            if not self.slots:
+                return None
+            first = min(self.slots)
+        return max(0, first * self.resolution - self.clock())
+
+    def fire(self):
+        now = self.clock()
+        self.wakeups += 1
+
+        due = []
+        with self.lock:
+            for slot in sorted(self.slots):
+                when = slot * self.resolution
+                if when > now + self.slack:
+                    break
+
+                for timer in self.slots.pop(slot):
+                    due.append(timer)
+
+                    # If we are late, e.g. after a suspend, skip the missed
+                    # ticks instead of firing them all in a row.
+                    deadline = timer.next_deadline(max(now, when))
+                    self.slots[self.slot(deadline)].append(timer)
+
+        for timer in due:
+            self.fired += 1
+            timer.callback()
+
+    def run(self):
+        while True:
+            delay = self.delay()
+            if delay is None:
+                return
+            if self.wake.wait(delay):
+                # A timer was added meanwhile
+                self.wake.clear()
+                continue
+            self.fire()
+
+    async def run_async(self):
+        while True:
+            delay = self.delay()
+            if delay is None:
+                return
+            await asyncio.sleep(delay)
+            self.fire()
+
+    def rates(self):
+        """
+        Timer and process wakeups per second since the previous call
+
+        """
+
+        now = time.monotonic()
+        process = util.process_stats()['wakeups']
+        last, self.last_report = self.last_report, (now, self.wakeups, process)
+        if last is None:
+            return None
+
+        elapsed = now - last[0]
+        return (
+            (self.wakeups - last[1]) / elapsed,
+            (process - last[2]) / elapsed,
+        )
+
+    def report(self):
+        rates = self.rates()
+        if rates is not None:
+            self.log.info(
+                '{0:.2f} timer wakeups/s, {1:.2f} process wakeups/s',
+                *rates
+            )
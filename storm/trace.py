@@ -0,0 +1,280 @@
+import sys
+import json
+import time
+import threading
+
+from storm import conf
+from storm import util
+
+VERSION = 1
+
+# The recorder of this process, if any; see `start()`
+recorder = None
+
+
+class Recorder(util.LoggedClass):
+    """
+    Appends events to a trace, one JSON object per line
+
+    The first line is a header with the config, so that a replay renders
+    the same bolts with the same colors. Every event has `t`, the monotonic
+    clock at the time, which is the same clock for all processes on the
+    machine, so the traces of the storm and the cloud process can be merged.
+
+    """
+
+    def __init__(self, path, role='storm', clock=time.monotonic):
+        self.path = path
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.events = 0
+
+        self.fp = open(path, 'w')
+        self.write({
+            'kind': 'header',
+            'version': VERSION,
+            'role': role,
+            't': clock(),
+            'config': conf.CONFIG,
+        })
+
+        super().__init__()
+
+    def write(self, event):
+        line = json.dumps(event, default=repr)
+        with self.lock:
+            self.fp.write(line + '\n')
+            self.fp.flush()
+
+    def record(self, kind, **fields):
+        fields['kind'] = kind
+        fields['t'] = self.clock()
+        self.events += 1
+        self.write(fields)
+
+
+def start(path, role='storm'):
+    global recorder
+    recorder = Recorder(path, role)
+    return recorder
+
+
+def record(kind, **fields):
+    """
+    Add an event to the trace, if this process records one
+
+    """
+
+    if recorder is not None:
+        recorder.record(kind, **fields)
+
+
+def load(*paths):
+    """
+    The config of the first trace and the events of all, in order of time
+
+    """
+
+    config = None
+    events = []
+    for path in paths:
+        with open(path) as fp:
+            for line in fp:
+                event = json.loads(line)
+                if event['kind'] == 'header':
+                    if event.get('version') != VERSION:
+                        raise ValueError(
+                            '{0} is not a version {1} trace'.format(
+                                path, VERSION
+                            )
+                        )
+                    if config is None:
+                        config = event['config']
+                    continue
+                events.append(event)
+
+    if config is None:
+        raise ValueError('No trace header found')
+
+    events.sort(key=lambda e: e['t'])
+    return config, events
+
+
+class Sink():
+    """
+    Takes the lines of the cloud in place of dzen2
+
+    """
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, text):
+        if text.strip():
+            self.lines.append(text.strip('\n'))
+
+    def flush(self):
+        pass
+
+
+class Replay(util.LoggedClass):
+    """
+    Feeds a trace through the formatter, the bolt lines and the renderer
+
+    Nothing that a source would talk to is needed: the values that were
+    written are formatted again and handed to a cloud over a channel, and
+    its lines go to a `Sink`. The renderer runs on the time of the trace,
+    divided by `speed`. With a `speed` of 0 there is no waiting at all and
+    the time just jumps to the next event or render, which makes a replay
+    deterministic; with a `speed` the events are paced in real time.
+
+    Inotify events of the cloud only request a render, since the values
+    come from the writes.
+
+    """
+
+    def __init__(self, config, events, speed=0, width=1920):
+        from storm import cloud
+        from storm import channel
+        from storm import render
+        from storm import storm
+
+        conf.CONFIG = config
+        self.events = events
+        self.speed = speed
+        self.origin = events[0]['t'] if events else 0
+        self.now = 0.0
+        self.started = None
+
+        self.sink = Sink()
+        self.channel = channel.Channel()
+        self.storm = storm.Storm(storm.StormFormatter(), self.channel)
+
+        self.cloud = cloud.Cloud(self.channel, self.sink)
+        self.cloud.setup_lines()
+        self.cloud.width = width
+
+        settings = config.get('render', {})
+        self.cloud.renderer = self.renderer = render.Renderer(
+            self.cloud.compile,
+            self.cloud.emit,
+            fps=settings.get('fps', 10),
+            debounce=settings.get('debounce', 0.02),
+            clock=self.clock
+        )
+
+        # Events since the last render, as the times they were applied
+        self.pending = []
+        self.latencies = []
+        self.unchanged = 0
+        self.counts = {}
+
+        super().__init__()
+
+    def clock(self):
+        return self.now
+
+    def wait(self, t):
+        if self.speed:
+            delay = self.started + t / self.speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        self.now = max(self.now, t)
+
+    def advance(self, t):
+        """
+        Run the renders that are due before `t`, then move on to it
+
+        """
+
+        while True:
+            due = self.renderer.due()
+            if due is None or due > t:
+                break
+
+            self.wait(due)
+            emitted = self.renderer.emitted
+            self.renderer.poll()
+            if self.renderer.emitted > emitted:
+                self.latencies.extend(self.now - a for a in self.pending)
+            else:
+                self.unchanged += len(self.pending)
+            self.pending = []
+
+        self.wait(t)
+
+    def apply(self, event):
+        kind = event['kind']
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+        if kind == 'write':
+            self.storm.write(event['name'], event['data'], output=False)
+            self.cloud.read_channel()
+        elif kind == 'stale':
+            self.storm.stale(event['name'])
+            self.cloud.read_channel()
+        elif kind == 'inotify':
+            self.renderer.request()
+        else:
+            # What the sources were called with, for the record only
+            return
+
+        self.pending.append(self.now)
+
+    def run(self):
+        self.started = time.monotonic()
+        cpu = time.process_time()
+
+        for event in self.events:
+            self.advance(event['t'] - self.origin)
+            self.apply(event)
+
+        # The last events still have a render coming
+        while self.renderer.due() is not None:
+            self.advance(self.renderer.due())
+
+        self.cpu = time.process_time() - cpu
+        return self.stats()
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+
+        def quantile(q):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+        return {
+            "events": dict(self.counts),
+            "lines": len(self.sink.lines),
+            "renders": self.renderer.renders,
+            "unchanged": self.unchanged,
+            "latency_p50": quantile(0.5),
+            "latency_p99": quantile(0.99),
+            "latency_max": latencies[-1] if latencies else 0.0,
+            "cpu": self.cpu,
+        }
+
+
+def replay(paths, speed=0, out=None):
+    out = out or sys.stdout
+    config, events = load(*paths)
+    stats = Replay(config, events, speed).run()
+
+    applied = sum(stats['events'].get(k, 0) for k in ('write', 'inotify'))
+    out.write('%-24s %s\n' % ('events', ', '.join(
+        '%d %s' % (n, kind) for kind, n in sorted(stats['events'].items())
+    )))
+    out.write('%-24s %d\n' % ('lines emitted', stats['lines']))
+    out.write('%-24s %d\n' % ('renders', stats['renders']))
+    out.write('%-24s %d\n' % ('events without a change', stats['unchanged']))
+    for name in ('latency_p50', 'latency_p99', 'latency_max'):
+        out.write('%-24s %.2f ms\n' % (
+            name.replace('_', ' '), stats[name] * 1e3
+        ))
+    out.write('%-24s %.3f s\n' % ('cpu', stats['cpu']))
+    if applied:
+        out.write('%-24s %.1f us\n' % (
+            'cpu per event', stats['cpu'] / applied * 1e6
+        ))
+    return stats
@@ -0,0 +1,70 @@
+import socket
+
+from storm import util
+
+NETLINK_KOBJECT_UEVENT = 15
+
+# The multicast group of the uevents straight from the kernel, as opposed to
+# the ones udev sends out after processing them.
+KERNEL_GROUP = 1
+
+
+def parse(data):
+    """
+    Turn a raw uevent into a dict of its environment
+
+    data = b"change@/devices/.../BAT0\0ACTION=change\0SUBSYSTEM=power_supply\0"
+
+    """
+
+    event = {}
+    for part in data.split(b'\0')[1:]:
+        key, sep, value = part.decode(errors='replace').partition('=')
+        if sep:
+            event[key] = value
+    return event
+
+
+class Monitor(util.LoggedClass):
+    """
+    Kernel uevents for a set of subsystems, e.g. "power_supply" or "drm"
+
+    This is a watcher for `Hooker.event`; it has a non-blocking socket to
+    wait on, and `read()` returns the events that are of interest. Tests can
+    hand in one end of a socketpair instead of the netlink socket.
+
+    """
+
+    def __init__(self, *subsystems, sock=None):
+        if sock is None:
+            sock = socket.socket(
+                socket.AF_NETLINK,
+                socket.SOCK_DGRAM,
+                NETLINK_KOBJECT_UEVENT
+            )
+            sock.bind((0, KERNEL_GROUP))
+
+        sock.setblocking(False)
+        self.sock = sock
+        self.subsystems = set(subsystems)
+        self.events = 0
+
+        super().__init__()
+
+    def fds(self):
+        return [self.sock.fileno()]
+
+    def read(self):
+        events = []
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                break
+
+            event = parse(data)
+            if event.get('SUBSYSTEM') in self.subsystems:
+                events.append(event)
+
+        self.events += len(events)
+        return events
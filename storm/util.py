@@ -1,4 +1,7 @@
+import os
 import re
+import tempfile
+import threading
 import subprocess as sub
 import logbook
 import datetime
@@ -27,20 +30,56 @@ class LoggedClass():
         # self.log.debug('Loaded logger for {0}', name)
 
 
+class shared_property():
+    """
+    Like functools.cached_property, but built only once across threads
+
+    The sources that share a resource, e.g. a netlink socket, can first ask
+    for it from the event thread and a pool worker at the same time. Since
+    Python 3.12 cached_property does not lock, and both would build one.
+    The value is kept in the instance __dict__, where it can be dropped to
+    be built again.
+
+    """
+
+    def __init__(self, function):
+        self.function = function
+        self.name = function.__name__
+        self.__doc__ = function.__doc__
+        self.lock = threading.Lock()
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        try:
+            return instance.__dict__[self.name]
+        except KeyError:
+            pass
+
+        with self.lock:
+            if self.name not in instance.__dict__:
+                instance.__dict__[self.name] = self.function(instance)
+            return instance.__dict__[self.name]
+
+
 class AcpiBattery(LoggedClass):
+    rxp = re.compile(
+        r'Battery (?P<id>\d+): '
+        r'(?P<status>\S+), '
+        r'(?P<percent>\d+)%'
+        r'(, (?P<time>\d\d:\d\d:\d\d) \S+)?'
+    )
+
     def __init__(self, line):
         self.line = line
         super(AcpiBattery, self).__init__()
 
     def parse(self):
-        rxp = (
-            r'Battery (?P<id>\d+): '
-            r'(?P<status>\S+), '
-            r'(?P<percent>\d+)%'
-            r'(, (?P<time>\d\d:\d\d:\d\d) \S+)?'
-        )
-
-        match = re.search(rxp, self.line)
+        match = self.rxp.search(self.line)
         if match:
             data = match.groupdict()
 
@@ -100,7 +139,46 @@ def time_left(seconds):
     return s.format(*(int(x[0]) for x in items))
 
 
-def get_screen_size():
+def human_rate(rate):
+    """
+    Bytes per second as e.g. "512B", "12.3K" or "4.0M"
+
+    """
+
+    for unit in ('B', 'K', 'M'):
+        if rate < 1024:
+            break
+        rate /= 1024
+    else:
+        unit = 'G'
+
+    if unit == 'B':
+        return '{0:.0f}{1}'.format(rate, unit)
+    return '{0:.1f}{1}'.format(rate, unit)
+
+
+def atomic_write(path, data):
+    """
+    Replace the contents of `path` in one go
+
+    The data goes into a temporary dotfile next to `path` that is then renamed
+    over it, so a reader sees either the old or the new contents but never a
+    truncated file.
+
+    """
+
+    directory, name = os.path.split(path)
+    fd, tmp = tempfile.mkstemp(prefix='.%s.' % name, dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as fp:
+            fp.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        os.unlink(tmp)
+        raise
+
+
+def get_screen_size(output=None):
     """
     Use xrandr to get the screen size.
 
@@ -108,9 +186,63 @@ def get_screen_size():
     but it is too old to work in Python3, and it is non-trivial to port it.
     This will do for now.
 
+    The size is that of `output` if it is connected, and otherwise that of
+    the first connected output.
+
     """
 
     args = ['xrandr', '--display', ':0']
     out = sub.Popen(args, stdout=sub.PIPE).communicate()[0].decode()
-    size = re.search(r'\bconnected\b (\d+)x(\d+)', out)
+
+    if output is not None:
+        size = re.search(
+            r'^%s connected (?:primary )?(\d+)x(\d+)' % re.escape(output),
+            out, re.M
+        )
+        if size:
+            return int(size.group(1))
+
+    size = re.search(r'\bconnected\b (?:primary )?(\d+)x(\d+)', out)
     return int(size.group(1))
+
+
+def process_stats(pid='self'):
+    """
+    Thread count, resident memory in kB, wakeups and CPU seconds of a process
+
+    procfs has no real wakeup counter, so the voluntary context switches of
+    all threads are summed instead; every sleep that ends is one of those.
+
+    """
+
+    root = os.path.join('/proc', str(pid))
+    stats = {'threads': 0, 'rss': 0, 'wakeups': 0, 'cpu': 0.0}
+
+    with open(os.path.join(root, 'stat')) as fp:
+        # The name in parentheses can hold spaces; utime and stime are the
+        # 14th and 15th fields.
+        fields = fp.read().rpartition(')')[2].split()
+    ticks = os.sysconf('SC_CLK_TCK')
+    stats['cpu'] = (int(fields[11]) + int(fields[12])) / ticks
+
+    with open(os.path.join(root, 'status')) as fp:
+        for line in fp:
+            key, _, value = line.partition(':')
+            if key == 'Threads':
+                stats['threads'] = int(value)
+            elif key == 'VmRSS':
+                stats['rss'] = int(value.split()[0])
+
+    for task in os.listdir(os.path.join(root, 'task')):
+        try:
+            fp = open(os.path.join(root, 'task', task, 'status'))
+        except OSError:
+            # The thread exited while we were looking
+            continue
+
+        with fp:
+            for line in fp:
+                if line.startswith('voluntary_ctxt_switches'):
+                    stats['wakeups'] += int(line.split()[1])
+
+    return stats
@@ -0,0 +1,40 @@
+from storm import mixer
+
+
+def test_sample():
+    mixers = mixer.Mixers(
+        mixer=mixer.FakeMixer(volume=40),
+        master=mixer.FakeMixer(muted=True)
+    )
+    assert mixers.sample() == {'volume': 40, 'muted': True}
+
+
+def test_fds_of_both_mixers():
+    pcm, master = mixer.FakeMixer(), mixer.FakeMixer()
+    mixers = mixer.Mixers(mixer=pcm, master=master)
+    assert mixers.fds() == [pcm.r, master.r]
+
+
+def test_fds_are_not_repeated():
+    # The control can be on the default mixer itself
+    master = mixer.FakeMixer()
+    mixers = mixer.Mixers(mixer=master, master=master)
+    assert mixers.fds() == [master.r]
+
+
+def test_read_handles_the_events():
+    pcm, master = mixer.FakeMixer(), mixer.FakeMixer()
+    mixers = mixer.Mixers(mixer=pcm, master=master)
+    assert mixers.read() == []
+
+    pcm.set(volume=75)
+    pcm.set(volume=80)
+    assert mixers.read() == [2]
+    assert mixers.sample() == {'volume': 80, 'muted': False}
+
+    master.set(muted=True)
+    assert mixers.read() == [1]
+    assert mixers.sample() == {'volume': 80, 'muted': True}
+
+    assert mixers.read() == []
+    assert mixers.events == 2
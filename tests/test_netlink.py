@@ -0,0 +1,196 @@
+import os
+import socket
+
+import pytest
+
+from storm import netlink
+
+DEV = """\
+Inter-|   Receive                            |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes \
+   packets errs drop fifo colls carrier compressed
+    lo: {lo} 10 0 0 0 0 0 0 {lo} 10 0 0 0 0 0 0
+  eth0: {down} 20 0 0 0 0 0 0 {up} 30 0 0 0 0 0 0
+"""
+
+
+def pack_loopback(index):
+    flags = netlink.IFF_UP | netlink.IFF_LOWER_UP | netlink.IFF_LOOPBACK
+    body = netlink.IFINFOMSG.pack(socket.AF_UNSPEC, 1, index, flags, 0)
+    body += netlink.pack_attribute(netlink.IFLA_IFNAME, b'lo\0')
+    return netlink.pack(netlink.RTM_NEWLINK, body)
+
+
+@pytest.fixture
+def feed():
+    """
+    Addresses on one end of a socketpair, and the other end to feed it
+
+    """
+
+    ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    yield netlink.Addresses(ours, dump=False), theirs
+    ours.close()
+    theirs.close()
+
+
+def test_attributes_are_aligned():
+    data = (
+        netlink.pack_attribute(netlink.IFLA_IFNAME, b'eth0\0') +
+        netlink.pack_attribute(7, b'\1\2\3\4')
+    )
+
+    # "eth0\0" is padded up to the next 4 bytes
+    assert len(data) == 12 + 8
+    assert netlink.attributes(data) == {
+        netlink.IFLA_IFNAME: b'eth0\0',
+        7: b'\1\2\3\4',
+    }
+
+
+def test_attributes_stop_at_a_bad_length():
+    data = netlink.pack_attribute(1, b'\1\2\3\4') + b'\2\0\1\0'
+    assert netlink.attributes(data) == {1: b'\1\2\3\4'}
+
+
+def test_messages_in_one_datagram():
+    data = netlink.pack_link(2, 'eth0') + netlink.pack_address(2, '10.0.0.2')
+    kinds = [kind for kind, _ in netlink.messages(data)]
+    assert kinds == [netlink.RTM_NEWLINK, netlink.RTM_NEWADDR]
+
+
+def test_messages_ignore_a_truncated_header():
+    data = netlink.pack_link(2, 'eth0') + b'\0' * 8
+    assert len(list(netlink.messages(data))) == 1
+
+
+def test_nothing_to_read(feed):
+    addresses, _ = feed
+    assert addresses.read() == []
+    assert addresses.current() == ('N/A', None)
+
+
+def test_link_and_address(feed):
+    addresses, kernel = feed
+    kernel.send(
+        netlink.pack_link(2, 'eth0') + netlink.pack_address(2, '10.0.0.2')
+    )
+
+    assert addresses.read() == [netlink.RTM_NEWLINK, netlink.RTM_NEWADDR]
+    assert addresses.links == {2: ('eth0', True, False)}
+    assert addresses.current() == ('10.0.0.2', 'eth0')
+    assert addresses.events == 2
+
+
+def test_loopback_and_down_links_are_passed_over(feed):
+    addresses, kernel = feed
+    kernel.send(pack_loopback(1) + netlink.pack_address(1, '127.0.0.1'))
+    kernel.send(
+        netlink.pack_link(2, 'eth0', up=False) +
+        netlink.pack_address(2, '10.0.0.2')
+    )
+    addresses.read()
+    assert addresses.current() == ('N/A', None)
+
+    kernel.send(netlink.pack_link(2, 'eth0'))
+    addresses.read()
+    assert addresses.current() == ('10.0.0.2', 'eth0')
+
+
+def test_address_and_link_removed(feed):
+    addresses, kernel = feed
+    kernel.send(
+        netlink.pack_link(2, 'eth0') +
+        netlink.pack_address(2, '10.0.0.2') +
+        netlink.pack_link(3, 'wlan0') +
+        netlink.pack_address(3, '192.168.1.5')
+    )
+    addresses.read()
+    assert addresses.current() == ('10.0.0.2', 'eth0')
+
+    kernel.send(
+        netlink.pack_address(2, '10.0.0.2', kind=netlink.RTM_DELADDR)
+    )
+    addresses.read()
+    assert addresses.current() == ('192.168.1.5', 'wlan0')
+
+    kernel.send(netlink.pack_link(3, 'wlan0', kind=netlink.RTM_DELLINK))
+    addresses.read()
+    assert addresses.current() == ('N/A', None)
+    assert 3 not in addresses.addresses
+
+
+def test_other_families_are_ignored(feed):
+    addresses, kernel = feed
+    body = netlink.IFADDRMSG.pack(socket.AF_INET6, 64, 0, 0, 2)
+    body += netlink.pack_attribute(netlink.IFA_ADDRESS, b'\0' * 16)
+    kernel.send(
+        netlink.pack_link(2, 'eth0') +
+        netlink.pack(netlink.RTM_NEWADDR, body) +
+        netlink.pack(netlink.NLMSG_DONE, b'')
+    )
+
+    assert addresses.read() == [netlink.RTM_NEWLINK]
+    assert addresses.addresses == {}
+
+
+class Clock():
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def proc(tmpdir):
+    os.mkdir(str(tmpdir.join('net')))
+
+    def write(up, down, lo=0):
+        # In place, like procfs; Throughput keeps the file open
+        with open(str(tmpdir.join('net', 'dev')), 'w') as fp:
+            fp.write(DEV.format(up=up, down=down, lo=lo))
+
+    write(1000, 5000)
+    return str(tmpdir), write
+
+
+def test_throughput(proc):
+    root, write = proc
+    clock = Clock()
+    throughput = netlink.Throughput(root, min_age=1.0, clock=clock)
+
+    # Nothing to compare the first sample with
+    assert throughput.sample() == {}
+
+    write(3000, 13000)
+    clock.now += 2
+    rates = throughput.sample()
+    assert rates['eth0'] == {'up': 1000.0, 'down': 4000.0}
+    assert rates['lo'] == {'up': 0.0, 'down': 0.0}
+
+
+def test_throughput_keeps_rates_within_min_age(proc):
+    root, write = proc
+    clock = Clock()
+    throughput = netlink.Throughput(root, min_age=1.0, clock=clock)
+    throughput.sample()
+
+    write(3000, 13000)
+    clock.now += 2
+    rates = throughput.sample()
+
+    write(99000, 99000)
+    clock.now += 0.5
+    assert throughput.sample() == rates
+
+
+def test_throughput_after_a_counter_reset(proc):
+    root, write = proc
+    clock = Clock()
+    throughput = netlink.Throughput(root, min_age=1.0, clock=clock)
+    throughput.sample()
+
+    write(10, 10)
+    clock.now += 1
+    assert throughput.sample()['eth0'] == {'up': 0.0, 'down': 0.0}
@@ -0,0 +1,221 @@
+import io
+import os
+import tarfile
+
+import pytest
+
+from storm import pacman
+
+DESC = "%NAME%\n{0}\n\n%VERSION%\n{1}\n\n%DESC%\nA package\n\n"
+
+# The cases of vercmptest.sh from pacman; each is also checked in reverse.
+VERCMP = [
+    ('1.5.0', '1.5.0', 0),
+    ('1.5.1', '1.5.0', 1),
+    ('1.5.1', '1.5', 1),
+    ('1.5.0-1', '1.5.0-1', 0),
+    ('1.5.0-1', '1.5.0-2', -1),
+    ('1.5.0-1', '1.5.1-1', -1),
+    ('1.5.0-2', '1.5.1-1', -1),
+    ('1.5-1', '1.5.1-1', -1),
+    ('1.5-2', '1.5.1-1', -1),
+    ('1.5-2', '1.5.1-2', -1),
+    ('1.5', '1.5-1', 0),
+    ('1.5-1', '1.5', 0),
+    ('1.1-1', '1.1', 0),
+    ('1.0-1', '1.1', -1),
+    ('1.1-1', '1.0', 1),
+    ('1.5b-1', '1.5-1', -1),
+    ('1.5b', '1.5', -1),
+    ('1.5b-1', '1.5', -1),
+    ('1.5b', '1.5.1', -1),
+    ('1.0a', '1.0alpha', -1),
+    ('1.0alpha', '1.0b', -1),
+    ('1.0b', '1.0beta', -1),
+    ('1.0beta', '1.0rc', -1),
+    ('1.0rc', '1.0', -1),
+    ('1.5.a', '1.5', 1),
+    ('1.5.b', '1.5.a', 1),
+    ('1.5.1', '1.5.b', 1),
+    ('1.5.b-1', '1.5.b', 0),
+    ('1.5-1', '1.5.b', -1),
+    ('2.0', '2_0', 0),
+    ('2.0_a', '2_0.a', 0),
+    ('2.0a', '2.0.a', -1),
+    ('2___a', '2_a', 1),
+    ('0:1.0', '0:1.0', 0),
+    ('0:1.0', '0:1.1', -1),
+    ('1:1.0', '0:1.0', 1),
+    ('1:1.0', '0:1.1', 1),
+    ('1:1.0', '2:1.1', -1),
+    ('1:1.0', '0:1.0-1', 1),
+    ('1:1.0-1', '0:1.1-1', 1),
+    ('0:1.0', '1.0', 0),
+    ('0:1.0', '1.1', -1),
+    ('0:1.1', '1.0', 1),
+    ('1:1.0', '1.0', 1),
+    ('1:1.0', '1.1', 1),
+    ('1:1.1', '1.1', 1),
+]
+
+
+@pytest.mark.parametrize('a, b, expected', VERCMP)
+def test_vercmp(a, b, expected):
+    assert pacman.vercmp(a, b) == expected
+    assert pacman.vercmp(b, a) == -expected
+
+
+def test_split_evr():
+    assert pacman.split_evr('1:2.3-4') == ('1', '2.3', '4')
+    assert pacman.split_evr('2.3-4') == ('0', '2.3', '4')
+    assert pacman.split_evr('2.3') == ('0', '2.3', None)
+
+
+def test_parse_desc():
+    assert pacman.parse_desc(DESC.format('linux', '4.2.5-1')) == (
+        'linux', '4.2.5-1'
+    )
+    assert pacman.parse_desc('%DESC%\nNothing\n') == (None, None)
+
+
+def install(root, name, version):
+    path = os.path.join(root, 'local', '%s-%s' % (name, version))
+    os.makedirs(path)
+    with open(os.path.join(path, 'desc'), 'w') as fp:
+        fp.write(DESC.format(name, version))
+
+
+def sync_db(root, repo, packages):
+    path = os.path.join(root, 'sync', '%s.db' % repo)
+    with tarfile.open(path, 'w:gz') as tar:
+        for name, version in packages.items():
+            data = DESC.format(name, version).encode()
+            info = tarfile.TarInfo('%s-%s/desc' % (name, version))
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+@pytest.fixture
+def db(tmpdir):
+    root = str(tmpdir)
+    os.makedirs(os.path.join(root, 'local'))
+    os.makedirs(os.path.join(root, 'sync'))
+    with open(os.path.join(root, 'local', 'ALPM_DB_VERSION'), 'w') as fp:
+        fp.write('9\n')
+
+    install(root, 'linux', '4.2.5-1')
+    install(root, 'bash', '4.3.042-4')
+    install(root, 'vim', '7.4.898-1')
+    install(root, 'local-only', '1.0-1')
+
+    sync_db(root, 'core', {
+        'linux': '4.2.5-1',
+        'bash': '4.3.042-5',
+    })
+    sync_db(root, 'extra', {
+        # core comes first, so this one does not count
+        'bash': '5.0-1',
+        'vim': '1:7.4.900-1',
+    })
+    return root
+
+
+def test_counts(db):
+    packages = pacman.Packages(db)
+    assert packages.counts() == {'installed': 4, 'new': 2}
+
+
+def test_counts_are_cached(db):
+    packages = pacman.Packages(db)
+    packages.counts()
+    parses = packages.parses
+
+    packages.counts()
+    assert packages.parses == parses
+
+
+def test_counts_follow_a_new_sync_db(db):
+    packages = pacman.Packages(db)
+    packages.counts()
+    parses = packages.parses
+
+    sync_db(db, 'core', {'linux': '4.2.6-1', 'bash': '4.3.042-4'})
+    os.utime(os.path.join(db, 'sync', 'core.db'), ns=(1, 1))
+
+    assert packages.counts() == {'installed': 4, 'new': 2}
+    # Only core is parsed again
+    assert packages.parses == parses + 1
+
+
+def test_counts_follow_the_local_db(db):
+    packages = pacman.Packages(db)
+    packages.counts()
+
+    install(db, 'zsh', '5.1.1-1')
+    os.utime(os.path.join(db, 'local'), ns=(1, 1))
+    assert packages.counts() == {'installed': 5, 'new': 2}
+
+
+def test_no_sync_dbs(tmpdir):
+    root = str(tmpdir)
+    install(root, 'linux', '4.2.5-1')
+
+    packages = pacman.Packages(root, os.path.join(root, 'missing'))
+    assert packages.counts() == {'installed': 1, 'new': 0}
+
+
+@pytest.fixture
+def refresh(tmpdir, monkeypatch):
+    """
+    A Refresh that runs a fake fakeroot, which exits with `status`
+
+    """
+
+    bin = tmpdir.mkdir('bin')
+    status = bin.join('status')
+    status.write('0')
+
+    fakeroot = bin.join('fakeroot')
+    fakeroot.write('#!/bin/sh\nread status < %s\nexit $status\n' % status)
+    fakeroot.chmod(0o755)
+    monkeypatch.setenv('PATH', str(bin))
+
+    return pacman.Refresh(str(tmpdir.join('fakedb'))), status
+
+
+def run(refresh, done):
+    assert refresh.start(done)
+    refresh.thread.join(5)
+
+
+def test_refresh(refresh):
+    refresh, _ = refresh
+    calls = []
+    run(refresh, lambda: calls.append(True))
+
+    assert calls == [True]
+    assert refresh.failures == 0
+
+
+def test_failed_refresh_is_not_done(refresh):
+    refresh, status = refresh
+    status.write('1')
+    calls = []
+    run(refresh, lambda: calls.append(True))
+
+    assert calls == []
+    assert refresh.failures == 1
+
+
+def test_refresh_errors_are_caught(refresh, monkeypatch):
+    refresh, _ = refresh
+
+    def done():
+        raise FileNotFoundError('/var/lib/pacman/local')
+    run(refresh, done)
+    assert refresh.failures == 1
+
+    # No fakeroot at all
+    monkeypatch.setenv('PATH', '/nonexistent')
+    run(refresh, None)
+    assert refresh.failures == 2
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from storm import procfs
+
+FILES = {
+    'loadavg': '0.22 0.24 0.23 2/812 31337\n',
+    'meminfo': (
+        'MemTotal:       16323412 kB\n'
+        'MemFree:          663012 kB\n'
+        'SwapTotal:       8388604 kB\n'
+        'SwapFree:        8388604 kB\n'
+    ),
+    'stat': (
+        'cpu  1228712 472 318921 21093823 0 0 0 0 0 0\n'
+        'processes 93051\n'
+        'procs_running 2\n'
+        'procs_blocked 0\n'
+    ),
+}
+
+
+@pytest.fixture
+def root(tmpdir):
+    for name, text in FILES.items():
+        tmpdir.join(name).write(text)
+    for pid in ('1', '42', '31337'):
+        tmpdir.mkdir(pid)
+    # Not processes
+    tmpdir.mkdir('net')
+    tmpdir.mkdir('self')
+    return str(tmpdir)
+
+
+def test_sample(root):
+    snapshot = procfs.Sampler(root).sample()
+    assert snapshot['load'] == (0.22, 0.24, 0.23)
+    assert snapshot['tasks'] == 812
+    assert snapshot['meminfo']['MemFree'] == 663012
+    assert snapshot['procs_running'] == 2
+
+
+def test_processes_are_not_tasks(root):
+    # The threads are counted in loadavg, but not in the pid directories
+    assert procfs.Sampler(root).sample()['processes'] == 3
+
+
+def test_snapshot_is_shared_within_max_age(root):
+    sampler = procfs.Sampler(root, max_age=60)
+    sampler.sample()
+
+    os.mkdir(os.path.join(root, '43'))
+    assert sampler.sample()['processes'] == 3
+    assert sampler.snapshots == 1
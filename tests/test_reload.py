@@ -0,0 +1,130 @@
+import copy
+import time
+import threading
+from collections import Counter
+
+import pytest
+
+from storm import channel
+from storm import conf
+from storm import scheduler
+from storm import storm
+
+CONFIG = {
+    'colors': {'fg_1': '#ffffff', 'bg_1': '#000000', 'icon': '', 'sep': ''},
+    'font': {'name': 'fixed', 'width': 6},
+    'mail': {'mailroot': '/nonexistent'},
+    'items': {'left': [{'runner': 'first'}], 'right': []},
+}
+
+
+class Formatter():
+    def first(self, data):
+        return '%s %s' % (conf.CONFIG['colors']['fg_1'], data)
+
+    def second(self, data):
+        return '%s %s' % (conf.CONFIG['colors']['fg_1'], data)
+
+
+class FakeStorm(storm.Storm):
+    hooker = storm.Hooker()
+
+    def __init__(self):
+        super().__init__(Formatter(), channel.Channel())
+        self.runs = Counter()
+
+    @hooker.static
+    def first(self):
+        self.runs['first'] += 1
+        return 'first'
+
+    @hooker.static
+    def second(self):
+        self.runs['second'] += 1
+        return 'second'
+
+
+def wait_for(condition, timeout=5):
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            raise AssertionError('Timed out waiting')
+        time.sleep(0.01)
+
+
+def daemon(target, *args):
+    # The scheduler never stops its threads, which would keep pytest alive
+    t = threading.Thread(None, target, args=args)
+    t.daemon = True
+    t.start()
+
+
+@pytest.fixture
+def running(monkeypatch):
+    """
+    A FakeStorm on a started ThreadScheduler, and a Reloader for it
+
+    The reloader sees a new fingerprint on every check, and loads whatever
+    config is in `configs`.
+
+    """
+
+    # Not setattr, which would load the real config to restore it later
+    monkeypatch.setitem(vars(conf), 'CONFIG', copy.deepcopy(CONFIG))
+
+    s = FakeStorm()
+    s.scheduler = scheduler.ThreadScheduler(
+        s, report=0, names=scheduler.configured(conf.CONFIG)
+    )
+    monkeypatch.setattr(s.scheduler, 'thread', daemon)
+    s.scheduler.start()
+    wait_for(lambda: s.runs['first'] == 1)
+
+    configs = []
+    checks = iter(range(1000))
+    monkeypatch.setattr(conf, 'fingerprint', lambda: next(checks))
+    monkeypatch.setattr(conf, 'load', lambda: configs.pop(0))
+
+    reloader = conf.Reloader()
+    reloader.subscribe(s.reload)
+    return s, reloader, configs
+
+
+def test_unaffected_source_is_not_run_again(running):
+    s, reloader, configs = running
+
+    new = copy.deepcopy(CONFIG)
+    new['colors']['fg_1'] = '#ff0000'
+    new['items']['right'] = [{'runner': 'second'}]
+    configs.append(new)
+
+    assert reloader.check() == {'colors', 'items'}
+    wait_for(lambda: s.runs['second'] == 1)
+
+    # The new colors are applied to the last value, without running again
+    assert s.runs['first'] == 1
+    assert s.last['first'] == '#ff0000 first'
+    assert s.last['second'] == '#ff0000 second'
+
+
+def test_unchanged_config_runs_nothing(running):
+    s, reloader, configs = running
+    configs.append(copy.deepcopy(CONFIG))
+
+    assert reloader.check() == set()
+    assert reloader.reloads == 0
+    assert s.runs == Counter({'first': 1})
+
+
+def test_removed_source_is_not_collected(running):
+    s, reloader, configs = running
+
+    new = copy.deepcopy(CONFIG)
+    new['items']['left'] = [{'runner': 'second'}]
+    configs.append(new)
+
+    reloader.check()
+    wait_for(lambda: s.runs['second'] == 1)
+
+    s.scheduler.collect('first', s.first)
+    assert s.runs['first'] == 1
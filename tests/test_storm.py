@@ -0,0 +1,37 @@
+from storm import channel
+from storm import storm
+
+
+class Formatter():
+    def stale(self, text):
+        return '%s ?' % text
+
+
+def make_storm():
+    return storm.Storm(Formatter(), channel.Channel())
+
+
+def test_stale_marks_a_bolt_once():
+    s = make_storm()
+    s.write('tags', 'text')
+
+    s.stale('tags')
+    s.stale('tags')
+    s.stale('tags')
+
+    assert s.channel.drain() == {'tags': 'text ?'}
+    assert s.last['tags'] == 'text'
+
+
+def test_write_clears_the_stale_mark():
+    s = make_storm()
+    s.write('tags', 'text')
+    s.stale('tags')
+    s.channel.drain()
+
+    # The very same text as before the timeout is not skipped
+    s.write('tags', 'text')
+    assert s.channel.drain() == {'tags': 'text'}
+
+    s.stale('tags')
+    assert s.channel.drain() == {'tags': 'text ?'}
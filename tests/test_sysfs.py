@@ -0,0 +1,135 @@
+import os
+import shutil
+import threading
+
+import pytest
+
+from storm import sysfs
+
+SUPPLIES = {
+    'AC': {'type': 'Mains', 'online': '0'},
+    'BAT0': {
+        'type': 'Battery', 'status': 'Discharging', 'capacity': '64',
+        'energy_now': '30240000', 'energy_full': '47250000',
+        'power_now': '11900000',
+    },
+    'BAT1': {
+        'type': 'Battery', 'status': 'Discharging',
+        'charge_now': '2100000', 'charge_full': '4200000',
+        'current_now': '900000',
+    },
+}
+
+
+def write(root, name, attr, value):
+    # In place, like sysfs; the attributes are kept open
+    with open(os.path.join(root, name, attr), 'w') as fp:
+        fp.write(value + '\n')
+
+
+def add(root, name, attributes):
+    os.makedirs(os.path.join(root, name))
+    for attr, value in attributes.items():
+        write(root, name, attr, value)
+
+
+@pytest.fixture
+def root(tmpdir):
+    for name, attributes in SUPPLIES.items():
+        add(str(tmpdir), name, attributes)
+    return str(tmpdir)
+
+
+def test_scan(root):
+    supplies = sysfs.PowerSupplies(root)
+    assert [(s.name, s.type) for s in supplies.supplies] == [
+        ('AC', 'Mains'), ('BAT0', 'Battery'), ('BAT1', 'Battery'),
+    ]
+
+    # Attributes that the supply does not have are not opened
+    assert 'capacity' not in supplies.supplies[2].attributes
+
+
+def test_percent_from_capacity_or_charge(root):
+    supplies = sysfs.PowerSupplies(root)
+    _, bat0, bat1 = supplies.supplies
+    assert bat0.percent() == 64
+    assert bat1.percent() == 50
+
+
+def test_seconds_left(root):
+    supplies = sysfs.PowerSupplies(root)
+    _, bat0, bat1 = supplies.supplies
+
+    # Energy over power, and charge over current
+    assert bat0.seconds_left() == 9148
+    assert bat1.seconds_left() == 8400
+
+    write(root, 'BAT1', 'status', 'Charging')
+    assert bat1.seconds_left() == 8400
+
+    write(root, 'BAT1', 'status', 'Full')
+    assert bat1.seconds_left() == 0
+
+
+def test_sample(root):
+    supplies = sysfs.PowerSupplies(root)
+    assert supplies.sample() == {
+        'percent': 57,
+        'ac_connected': False,
+        'time_left': '4:52:28',
+    }
+
+
+def test_sample_reads_again(root):
+    supplies = sysfs.PowerSupplies(root)
+
+    write(root, 'AC', 'online', '1')
+    write(root, 'BAT0', 'status', 'Charging')
+    write(root, 'BAT0', 'capacity', '90')
+    write(root, 'BAT1', 'status', 'Full')
+
+    sample = supplies.sample()
+    assert sample['ac_connected'] is True
+    assert sample['percent'] == 70
+
+
+def test_rescan_after_a_battery_is_removed(root):
+    supplies = sysfs.PowerSupplies(root)
+
+    shutil.rmtree(os.path.join(root, 'BAT1'))
+    supplies.scan()
+    assert [s.name for s in supplies.supplies] == ['AC', 'BAT0']
+    assert supplies.sample()['percent'] == 64
+
+
+def test_no_batteries(tmpdir):
+    add(str(tmpdir), 'AC', {'type': 'Mains', 'online': '1'})
+
+    supplies = sysfs.PowerSupplies(str(tmpdir))
+    assert supplies.sample() == {
+        'percent': None,
+        'ac_connected': True,
+        'time_left': '',
+    }
+
+
+def test_scan_and_sample_at_once(root):
+    # Uevents scan from one thread while the ticks sample from another
+    supplies = sysfs.PowerSupplies(root)
+    expected = supplies.sample()
+    done = threading.Event()
+
+    def scan():
+        while not done.is_set():
+            supplies.scan()
+
+    t = threading.Thread(None, scan)
+    t.start()
+    try:
+        samples = [supplies.sample() for _ in range(2000)]
+    finally:
+        done.set()
+        t.join()
+
+    assert all(sample == expected for sample in samples)
@@ -0,0 +1,52 @@
+import socket
+
+import pytest
+
+from storm import uevent
+
+BATTERY = (
+    b'change@/devices/LNXSYSTM:00/PNP0C0A:00/power_supply/BAT0\0'
+    b'ACTION=change\0'
+    b'DEVPATH=/devices/LNXSYSTM:00/PNP0C0A:00/power_supply/BAT0\0'
+    b'SUBSYSTEM=power_supply\0'
+    b'POWER_SUPPLY_NAME=BAT0\0'
+)
+
+HOTPLUG = (
+    b'change@/devices/pci0000:00/drm/card0\0'
+    b'ACTION=change\0'
+    b'SUBSYSTEM=drm\0'
+    b'HOTPLUG=1\0'
+)
+
+
+@pytest.fixture
+def feed():
+    ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    yield ours, theirs
+    ours.close()
+    theirs.close()
+
+
+def test_parse():
+    event = uevent.parse(BATTERY)
+    assert event['ACTION'] == 'change'
+    assert event['SUBSYSTEM'] == 'power_supply'
+    assert event['POWER_SUPPLY_NAME'] == 'BAT0'
+
+    # The summary line is not part of the environment
+    assert len(event) == 4
+
+
+def test_only_the_subsystems_asked_for(feed):
+    ours, kernel = feed
+    monitor = uevent.Monitor('power_supply', sock=ours)
+
+    kernel.send(HOTPLUG)
+    kernel.send(BATTERY)
+    kernel.send(BATTERY.replace(b'ACTION=change', b'ACTION=remove'))
+
+    events = monitor.read()
+    assert [e['ACTION'] for e in events] == ['change', 'remove']
+    assert monitor.events == 2
+    assert monitor.read() == []
@@ -0,0 +1,45 @@
+import time
+import threading
+
+from storm import util
+
+
+class Resources():
+    def __init__(self):
+        self.built = 0
+
+    @util.shared_property
+    def socket(self):
+        self.built += 1
+        # Long enough for the other threads to ask as well
+        time.sleep(0.05)
+        return object()
+
+
+def test_shared_property_is_built_once():
+    resources = Resources()
+    barrier = threading.Barrier(8)
+    got = []
+
+    def ask():
+        barrier.wait()
+        got.append(resources.socket)
+
+    threads = [threading.Thread(None, ask) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert resources.built == 1
+    assert len(set(map(id, got))) == 1
+
+
+def test_shared_property_can_be_dropped():
+    resources = Resources()
+    first = resources.socket
+    assert resources.socket is first
+
+    del resources.__dict__['socket']
+    assert resources.socket is not first
+    assert resources.built == 2